@@ -8,6 +8,7 @@ import os
 import json
 import time
 import asyncio
+import functools
 import re
 from typing import List, Dict, Any
 from dataclasses import dataclass
@@ -17,7 +18,52 @@ from dotenv import load_dotenv
 # 環境変数を読み込み
 load_dotenv()
 
+import httpx
+import openai
 from openai import OpenAI
+import numpy as np
+
+# SDKデフォルト（60s timeout / 2 retries）はテイルレイテンシを増幅するため明示指定
+_API_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+
+@dataclass
+class Problems:
+    """問題集合のSoA（struct-of-arrays）表現
+
+    per-problem dictの代わりに列単位で保持することで、イテレーション時の
+    キャッシュ局所性を高め、1問あたりのメモリオーバーヘッドを削減する。
+    正答配列はnumpy配列なので、最終集計はベクトル化された1パスで行える。
+    """
+    question_ids: List[str]
+    questions: List[str]
+    options: List[List[str]]
+    correct_answers: np.ndarray  # dtype='<U1'
+    categories: List[str]
+
+    def __len__(self) -> int:
+        return len(self.question_ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Problems(
+                question_ids=self.question_ids[index],
+                questions=self.questions[index],
+                options=self.options[index],
+                correct_answers=self.correct_answers[index],
+                categories=self.categories[index],
+            )
+        # 互換性のため単一要素は従来のdict形式で返す
+        return {
+            'question_id': self.question_ids[index],
+            'question': self.questions[index],
+            'options': self.options[index],
+            'correct_answer': str(self.correct_answers[index]),
+            'category': self.categories[index],
+        }
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
 
 @dataclass
 class MMLUResult:
@@ -32,58 +78,69 @@ class MMLUResult:
 
 class SimpleMMLUScorer:
     """シンプルなMMLUスコアリングシステム"""
-    
-    def __init__(self):
-        # OpenAI APIキーの確認
+
+    # JSONスキーマ定義（全インスタンス共通なのでクラス属性として一度だけ確保）
+    _JSON_SCHEMA = {
+        "type": "object",
+        "properties": {
+            "final_answer": {
+                "type": "string",
+                "description": "選択した選択肢アルファベットのみ（A, B, C, D, E, F, G, H, I, Jのいずれか）",
+                "enum": ["A", "B", "C", "D", "E", "F", "G", "H", "I", "J"]
+            }
+        },
+        "required": ["final_answer"],
+        "additionalProperties": False
+    }
+
+    @classmethod
+    @functools.cache
+    def _shared_client(cls) -> OpenAI:
+        """全インスタンスで共有するOpenAIクライアント（TLS/認証コストを償却）"""
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OPENAI_API_KEY環境変数が設定されていません")
-        
-        self.client = OpenAI(api_key=api_key)
-        
-        # JSONスキーマ定義
-        self.json_schema = {
-            "type": "object",
-            "properties": {
-                "final_answer": {
-                    "type": "string",
-                    "description": "選択した選択肢アルファベットのみ（A, B, C, D, E, F, G, H, I, Jのいずれか）",
-                    "enum": ["A", "B", "C", "D", "E", "F", "G", "H", "I", "J"]
-                }
-            },
-            "required": ["final_answer"],
-            "additionalProperties": False
-        }
+        # リトライはSDKに任せず自前で制御する（max_retries=0）
+        return OpenAI(api_key=api_key, timeout=_API_TIMEOUT, max_retries=0)
+
+    def __init__(self):
+        # クライアントはクラスレベルのシングルトンを再利用
+        self.client = self._shared_client()
+        self.json_schema = self._JSON_SCHEMA
     
-    def load_csv_data(self, csv_path: str) -> List[Dict[str, Any]]:
-        """CSVファイルからデータを読み込み"""
+    def load_csv_data(self, csv_path: str) -> Problems:
+        """CSVファイルからデータを読み込み（SoA形式）"""
         import pandas as pd
-        
+
         if not os.path.exists(csv_path):
             raise FileNotFoundError(f"CSVファイルが見つかりません: {csv_path}")
-        
+
         df = pd.read_csv(csv_path)
-        problems = []
-        
+        question_ids, questions, options_col, correct_answers, categories = [], [], [], [], []
+
         for _, row in df.iterrows():
             try:
                 # 選択肢の解析
                 options_str = row['options']
                 options = self._parse_options(options_str)
-                
-                problem = {
-                    'question_id': str(row['question_id']),
-                    'question': str(row['question_ja']),  # 日本語版を使用
-                    'options': options,
-                    'correct_answer': str(row['answer']),
-                    'category': str(row['category'])
-                }
-                problems.append(problem)
-                
+
+                question_ids.append(str(row['question_id']))
+                questions.append(str(row['question_ja']))  # 日本語版を使用
+                options_col.append(options)
+                correct_answers.append(str(row['answer']))
+                categories.append(str(row['category']))
+
             except Exception as e:
                 print(f"問題 {row.get('question_id', 'unknown')} の読み込みエラー: {e}")
                 continue
-        
+
+        problems = Problems(
+            question_ids=question_ids,
+            questions=questions,
+            options=options_col,
+            correct_answers=np.array(correct_answers, dtype='<U1'),
+            categories=categories,
+        )
         print(f"✅ {len(problems)}問を読み込みました")
         return problems
     
@@ -197,22 +254,34 @@ class SimpleMMLUScorer:
         try:
             # 非同期でAPI呼び出し（実際にはOpenAI Python SDKは同期のみなので、run_in_executorを使用）
             loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None, 
-                lambda: self.client.responses.create(
-                    model="o3-mini",
-                    input=[{"role": "user", "content": user_prompt}],
-                    text={
-                        "format": {
-                            "type": "json_schema",
-                            "name": "mmlu_answer",
-                            "schema": self.json_schema,
-                            "strict": True
-                        }
-                    }
-                )
-            )
-            
+            timeout_s = 30.0
+            for attempt in range(2):
+                try:
+                    client = self.client.with_options(timeout=timeout_s)
+                    response = await loop.run_in_executor(
+                        None,
+                        lambda: client.responses.create(
+                            model="o3-mini",
+                            input=[{"role": "user", "content": user_prompt}],
+                            text={
+                                "format": {
+                                    "type": "json_schema",
+                                    "name": "mmlu_answer",
+                                    "schema": self.json_schema,
+                                    "strict": True
+                                }
+                            }
+                        )
+                    )
+                    break
+                except (openai.APITimeoutError, openai.APIConnectionError) as e:
+                    if attempt == 0:
+                        # タイムアウト/接続エラー時は倍のタイムアウトで1回だけ再投入
+                        timeout_s *= 2
+                        print(f"  ⏳ タイムアウト/接続エラー、{timeout_s:.0f}秒タイムアウトで再試行: {e}")
+                        continue
+                    raise
+
             response_time = time.time() - start_time
             
             # レスポンスから回答を抽出
@@ -254,67 +323,79 @@ class SimpleMMLUScorer:
                 "error": str(e)
             }
     
-    async def process_batch(self, problems: List[Dict[str, Any]], batch_size: int = 5) -> List[MMLUResult]:
+    async def process_batch(self, problems: Problems, batch_size: int = 5,
+                            done_file: str = None) -> List[MMLUResult]:
         """バッチ処理で問題を並行処理"""
         results = []
-        
-        # バッチに分割
+        done_fp = open(done_file, 'a', encoding='utf-8') if done_file else None
+
+        # バッチに分割（SoAをインデックスでイテレート）
         for i in range(0, len(problems), batch_size):
-            batch = problems[i:i + batch_size]
+            batch_indices = range(i, min(i + batch_size, len(problems)))
             batch_num = i // batch_size + 1
             total_batches = (len(problems) - 1) // batch_size + 1
-            
-            print(f"\n🔄 バッチ {batch_num}/{total_batches} ({len(batch)}問) を並行処理中...")
-            
+
+            print(f"\n🔄 バッチ {batch_num}/{total_batches} ({len(batch_indices)}問) を並行処理中...")
+
             # バッチ内の問題を並行実行
-            batch_tasks = []
-            for problem in batch:
-                task = self.get_answer_async(problem['question'], problem['options'])
-                batch_tasks.append((problem, task))
-            
+            batch_tasks = [
+                self.get_answer_async(problems.questions[j], problems.options[j])
+                for j in batch_indices
+            ]
+
             # 並行実行
-            batch_results = await asyncio.gather(*[task for _, task in batch_tasks], return_exceptions=True)
-            
+            batch_results = await asyncio.gather(*batch_tasks, return_exceptions=True)
+
             # 結果処理
-            for j, ((problem, _), answer_result) in enumerate(zip(batch_tasks, batch_results)):
+            for j, answer_result in zip(batch_indices, batch_results):
+                question_id = problems.question_ids[j]
+                correct_answer = str(problems.correct_answers[j])
                 if isinstance(answer_result, Exception):
-                    print(f"  ❌ 問題 {problem['question_id']}: エラー - {answer_result}")
+                    print(f"  ❌ 問題 {question_id}: エラー - {answer_result}")
                     answer_result = {
                         "predicted_answer": "",
                         "response_time": 0.0,
                         "success": False,
                         "error": str(answer_result)
                     }
-                
+
                 # 正答判定
-                is_correct = (answer_result['predicted_answer'] == problem['correct_answer'])
-                
+                is_correct = (answer_result['predicted_answer'] == correct_answer)
+
                 # 結果記録
                 result = MMLUResult(
-                    question_id=problem['question_id'],
-                    question=problem['question'],
-                    options=problem['options'],
-                    correct_answer=problem['correct_answer'],
+                    question_id=question_id,
+                    question=problems.questions[j],
+                    options=problems.options[j],
+                    correct_answer=correct_answer,
                     predicted_answer=answer_result['predicted_answer'],
                     is_correct=is_correct,
                     response_time=answer_result['response_time']
                 )
                 results.append(result)
-                
+
                 # 進捗表示
                 status = "✅" if is_correct else "❌"
-                print(f"  {status} 問題 {problem['question_id']}: "
-                      f"予測={answer_result['predicted_answer']}, 正解={problem['correct_answer']}")
-                
+                print(f"  {status} 問題 {question_id}: "
+                      f"予測={answer_result['predicted_answer']}, 正解={correct_answer}")
+
                 # エラー表示
                 if not answer_result['success']:
                     print(f"    ⚠️ エラー: {answer_result.get('error', 'Unknown error')}")
-            
+                elif done_fp is not None:
+                    # 成功した問題IDをチェックポイントに追記（再開時にスキップ）
+                    done_fp.write(question_id + "\n")
+
+            if done_fp is not None:
+                done_fp.flush()
+
             # バッチ間の待機（API制限対策）
             if i + batch_size < len(problems):
                 print(f"  ⏳ 次のバッチまで1秒待機...")
                 await asyncio.sleep(1)
-        
+
+        if done_fp is not None:
+            done_fp.close()
         return results
     
     def score_all_problems(self, csv_path: str, output_path: str = None, batch_size: int = 1) -> Dict[str, Any]:
@@ -324,15 +405,35 @@ class SimpleMMLUScorer:
     async def score_all_problems_async(self, csv_path: str, output_path: str = None, batch_size: int = 5) -> Dict[str, Any]:
         """全問題をスコアリング（非同期版）"""
         problems = self.load_csv_data(csv_path)
-        
+
+        # チェックポイントからスコアリング済みの問題をスキップ
+        done_file = output_path + ".done" if output_path else None
+        if done_file:
+            Path(done_file).parent.mkdir(parents=True, exist_ok=True)
+        if done_file and Path(done_file).exists():
+            done = set(Path(done_file).read_text(encoding='utf-8').splitlines())
+            if done:
+                keep = [i for i, qid in enumerate(problems.question_ids) if qid not in done]
+                skipped = len(problems) - len(keep)
+                if skipped:
+                    print(f"♻️ チェックポイントから再開: {skipped}問をスキップします")
+                    problems = Problems(
+                        question_ids=[problems.question_ids[i] for i in keep],
+                        questions=[problems.questions[i] for i in keep],
+                        options=[problems.options[i] for i in keep],
+                        correct_answers=problems.correct_answers[keep],
+                        categories=[problems.categories[i] for i in keep],
+                    )
+
         print(f"🚀 {len(problems)}問のスコアリングを開始... (バッチサイズ: {batch_size})")
-        
+
         # バッチ処理で実行
         if batch_size > 1:
-            results = await self.process_batch(problems, batch_size)
+            results = await self.process_batch(problems, batch_size, done_file=done_file)
         else:
             # バッチサイズ1の場合は順次処理
             results = []
+            done_fp = open(done_file, 'a', encoding='utf-8') if done_file else None
             for i, problem in enumerate(problems, 1):
                 print(f"[{i}/{len(problems)}] 問題 {problem['question_id']} を処理中...")
                 
@@ -363,15 +464,39 @@ class SimpleMMLUScorer:
                 # エラー表示
                 if not answer_result['success']:
                     print(f"  ⚠️ エラー: {answer_result.get('error', 'Unknown error')}")
-        
-        # 最終結果集計
-        correct_count = sum(1 for result in results if result.is_correct)
-        overall_accuracy = correct_count / len(results) if results else 0
-        
+                elif done_fp is not None:
+                    done_fp.write(problem['question_id'] + "\n")
+                    done_fp.flush()
+            if done_fp is not None:
+                done_fp.close()
+
+        # 最終結果集計（ベクトル化された1パス比較）
+        if results:
+            preds = np.array([r.predicted_answer for r in results], dtype='<U1')
+            correct_count = int((preds == problems.correct_answers[:len(preds)]).sum())
+            overall_accuracy = correct_count / len(results)
+        else:
+            correct_count = 0
+            overall_accuracy = 0
+        
+        # テイルレイテンシ統計（回帰を可視化するためサマリーに含める）
+        if results:
+            times = np.array([r.response_time for r in results])
+            latency_percentiles = {
+                "p50": float(np.percentile(times, 50)),
+                "p95": float(np.percentile(times, 95)),
+                "p99": float(np.percentile(times, 99)),
+            }
+            print(f"⏱️ レイテンシ: p50={latency_percentiles['p50']:.2f}s, "
+                  f"p95={latency_percentiles['p95']:.2f}s, p99={latency_percentiles['p99']:.2f}s")
+        else:
+            latency_percentiles = {}
+
         summary = {
             "total_questions": len(problems),
             "correct_answers": correct_count,
             "overall_accuracy": overall_accuracy,
+            "latency_percentiles": latency_percentiles,
             "results": results,
             "batch_size": batch_size
         }
@@ -392,6 +517,7 @@ class SimpleMMLUScorer:
             "total_questions": summary["total_questions"],
             "correct_answers": summary["correct_answers"],
             "overall_accuracy": summary["overall_accuracy"],
+            "latency_percentiles": summary.get("latency_percentiles", {}),
             "results": []
         }
         
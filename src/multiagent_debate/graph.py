@@ -3,20 +3,39 @@
 """
 New LangGraph Workflow for Conversational Agents (Async Corrected)
 """
+import hashlib
 import os
 import numpy as np
 import pathlib
+import random
+import re
 from typing import List
 import asyncio
 
+from cachetools import LRUCache
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
 from langgraph.graph import StateGraph, END
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import OpenAIEmbeddings
 from dotenv import load_dotenv
 
 from .state import ConversationState
-from .agents import ConversationalAgent, llm
+from .agents import (
+    ConversationalAgent,
+    EmergencyDecision,
+    _SUMMARY_REFRESH_INTERVAL,
+    _build_chain,
+    _http_async_client,
+    _http_client,
+    get_local_encoder,
+    llm,
+    update_history_summary,
+)
 from pydantic import BaseModel, Field
 
 # Load .env from project root
@@ -24,8 +43,82 @@ project_root = pathlib.Path(__file__).parent.parent.parent
 env_path = project_root / ".env"
 load_dotenv(dotenv_path=env_path)
 
-# Initialize embeddings for convergence score calculation
-embeddings = OpenAIEmbeddings(api_key=os.getenv("OPENAI_API_KEY"))
+# Initialize embeddings for convergence score calculation, on the same
+# shared connection pool as the chat chains so embedding and LLM calls
+# reuse warm connections instead of each holding their own pool.
+embeddings = OpenAIEmbeddings(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    http_client=_http_client,
+    http_async_client=_http_async_client,
+)
+
+# Agents quote and repeat each other; identical normalized text embeds
+# identically, so a hit skips the embedding round-trip entirely.
+_EMBED_CACHE: LRUCache = LRUCache(maxsize=512)
+
+# At most this many buffered statements go into one batched request;
+# older ones add nothing to a last-two-rows convergence signal.
+_EMBED_BATCH_MAX = 8
+
+
+async def _embed_statements(texts: List[str]) -> list:
+    """Embed several statements in one request, with per-text caching.
+
+    Prefers the optional local multilingual encoder (CPU-bound, kept off
+    the event loop); otherwise a single aembed_documents call amortizes
+    HTTP/TLS/JSON framing across all cache misses instead of paying one
+    round-trip per statement.
+    """
+    results: list = [None] * len(texts)
+    miss_indices, miss_keys = [], []
+    for i, text in enumerate(texts):
+        key = hashlib.sha256(text.strip().encode()).hexdigest()[:32]
+        cached = _EMBED_CACHE.get(key)
+        if cached is not None:
+            results[i] = cached
+        else:
+            miss_indices.append(i)
+            miss_keys.append(key)
+
+    if miss_indices:
+        miss_texts = [texts[i] for i in miss_indices]
+        local_encoder = get_local_encoder()
+        if local_encoder is not None:
+            vecs = await asyncio.to_thread(local_encoder.encode, miss_texts, normalize_embeddings=True)
+        else:
+            vecs = await embeddings.aembed_documents(miss_texts)
+        for i, key, vec in zip(miss_indices, miss_keys, vecs):
+            results[i] = vec
+            _EMBED_CACHE[key] = vec
+    return results
+
+# Phrases that signal a direct question to another participant; tracked
+# so the questioned agent gets a turn before the debate can conclude.
+_QUESTION_MARKERS = ("どう思う？", "どう考える？", "意見を聞かせて", "君はどう", "あなたはどう")
+
+if ahocorasick is not None:
+    _Q_AUTOMATON = ahocorasick.Automaton()
+    for _marker in _QUESTION_MARKERS:
+        _Q_AUTOMATON.add_word(_marker, _marker)
+    _Q_AUTOMATON.make_automaton()
+else:
+    _Q_AUTOMATON = None
+
+
+def _contains_question_marker(text: str) -> bool:
+    """One pass over the statement instead of one substring scan per marker."""
+    if _Q_AUTOMATON is not None:
+        return next(_Q_AUTOMATON.iter(text), None) is not None
+    return any(marker in text for marker in _QUESTION_MARKERS)
+
+
+# Convergence gating: embeddings are only worth paying for once the
+# debate could plausibly terminate and a cheap lexical overlap check
+# suggests consecutive statements are actually similar.
+MIN_TURNS_BEFORE_CONVERGENCE_CHECK = 4
+_JACCARD_PREFILTER_THRESHOLD = 0.4
+_WORD_RE = re.compile(r"\w+")
+
 
 # --- Facilitator Decision Model ---
 class FacilitatorDecision(BaseModel):
@@ -33,259 +126,490 @@ class FacilitatorDecision(BaseModel):
     reasoning: str = Field(description="Explanation of why this action was chosen")
     message: str = Field(description="Message to display to participants about the facilitation decision")
 
+
+# --- Module-level prompts and chains ---
+# Each of these used to be rebuilt from f-strings inside its node on
+# every call — template parsing, message allocation, and LCEL pipe
+# construction per invocation. Built once here; runtime values arrive
+# through template variables at ainvoke/astream time.
+_FACILITATOR_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """あなたは議論のファシリテータです。議論全体を俯瞰し、以下の情報を元に最適な次のアクションを決定してください。
+
+**利用可能なアクション:**
+- "continue": 議論を継続させる（まだ議論が浅い、または新しい視点が期待できる場合）
+- "propose_conclusion": 議論をまとめるフェーズへの移行を提案する（十分に議論が深まった場合）
+- "call_vote": 意見が明確に分かれている場合に多数決を促す
+
+**判断基準（人間らしい会話を最優先）:**
+1. **NEVER interrupt if there are pending questions** - 質問が残っている場合は絶対に継続
+2. **Continue if discussion_depth < 0.7** - 議論の深さが不十分な場合は継続
+3. **Continue if current_turn < max_turns * 0.6** - 最大ターンの60%未満は基本的に継続
+4. 議論が真に停滞している場合（同じ論点の3回以上の反復）のみ "propose_conclusion"
+5. 準備完了率 > 80% かつ 残りターン < 3 の場合のみ "propose_conclusion"
+
+議論のテーマ: {topic}"""),
+    ("human", """
+**現在の議論状況:**
+- 現在のターン: {current_turn} / {max_turns}
+- 議論の進行率: {progress_pct}%
+- 収束スコア: {convergence_score}
+- 準備完了率: {readiness_ratio} ({ready_count}/{total_flags})
+- 議論の深さ: {discussion_depth}
+- 未回答の質問数: {pending_count}
+
+**未回答の質問:**
+{pending_questions}
+
+**直近の議論内容:**
+{recent_turns}
+
+**重要:** 未回答の質問がある場合は必ず "continue" を選択してください。議論の自然な流れを最優先してください。
+"""),
+])
+
+_PRE_CONCLUSION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """あなたは議論のファシリテータです。これまでの議論をまとめて、暫定的な結論案を作成してください。
+
+**重要な指示:**
+1. 議論全体を客観的に要約してください
+2. 主要な論点とそれぞれの立場を明確に記述してください
+3. 合意に至った点と意見が分かれた点を区別してください
+4. 「これはまだ暫定的なまとめです」ということを明記してください
+5. 参加者に補足や修正意見を求めてください
+
+議論のテーマ: {topic}"""),
+    ("human", """
+以下の議論の記録を基に、暫定的な結論案を作成してください：
+
+{transcript}
+
+上記の議論を踏まえ、暫定的なまとめを作成し、参加者に最終確認を求めてください。
+"""),
+])
+
+_FINAL_COMMENT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """あなたは{agent_name}です。ファシリテータが作成した暫定的な結論案を確認し、最終的な意見を述べてください。
+
+**あなたの役割:** {persona}
+
+**指示:**
+1. 暫定的な結論案を読んで、内容が議論を適切に反映しているか確認してください
+2. 重要な論点の見落としや誤解がないかチェックしてください
+3. 必要であれば補足や修正を提案してください
+4. 簡潔に（2-3文程度で）最終意見を述べてください
+5. もし結論案に満足している場合は、その旨を述べてください"""),
+    ("human", """
+**暫定的な結論案:**
+{preliminary_conclusion}
+
+上記の結論案について、あなたの最終的な意見を述べてください。重要な見落としや修正が必要な点があれば指摘し、なければ結論案への賛同を表明してください。
+"""),
+])
+
+_CONCLUSION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """あなたは議論の結論をまとめる専門家です。以下の情報を統合して、最終的な結論を作成してください。
+
+**重要な指示:**
+1. 暫定的な結論案を基礎として使用してください
+2. 参加者の最終意見を十分に考慮して、必要な修正や補足を行ってください
+3. 最終的な結論は包括的で、全ての重要な論点を含むようにしてください
+4. 意見が分かれた場合は、それも明確に記述してください
+
+議論のテーマ: {topic}"""),
+    ("human", """
+**暫定的な結論案:**
+{preliminary_conclusion}
+
+**参加者の最終意見:**
+{final_comments}
+
+**完全な議論記録:**
+{transcript}
+
+上記の情報を統合して、最終的な結論を作成してください。
+"""),
+])
+
+_SIMPLE_CONCLUSION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "あなたは議論の結論をまとめる専門家です。以下の議論の完全な記録を読み、最終的な結論を客観的に要約してください。意見が分かれた場合は、それも明確に記述してください。議論のテーマ:{topic}"),
+    ("human", "{transcript}"),
+])
+
+_FACILITATOR_CHAIN = _FACILITATOR_PROMPT | llm.with_structured_output(FacilitatorDecision)
+_PRE_CONCLUSION_CHAIN = _PRE_CONCLUSION_PROMPT | llm
+_FINAL_COMMENT_CHAIN = _FINAL_COMMENT_PROMPT | llm
+_CONCLUSION_CHAIN = _CONCLUSION_PROMPT | llm
+_SIMPLE_CONCLUSION_CHAIN = _SIMPLE_CONCLUSION_PROMPT | llm
+
 # --- Graph Nodes (Async) ---
 
-async def agent_node_streaming(state: ConversationState):
-    """Executes the current speaker's turn with streaming output."""
+# Transcript lines look like "[Turn 3] 佐藤: ..."; one compiled match
+# replaces the split/strip/split chain the fallback used to run.
+_TURN_LINE_RE = re.compile(r"^\[Turn \d+\]\s+([^:]+):")
+
+
+def _choose_round_robin_speaker(state: ConversationState, agent_names: List[str]) -> str:
+    """Recover from an invalid nomination by rotating past the last speaker."""
+    last_speaker_name = state.get("last_speaker")
+    if not last_speaker_name and state["full_transcript"]:
+        match = _TURN_LINE_RE.match(state["full_transcript"][-1])
+        if match:
+            last_speaker_name = match.group(1).strip()
+    if last_speaker_name in agent_names:
+        last_speaker_index = agent_names.index(last_speaker_name)
+    else:
+        last_speaker_index = -1
+    return agent_names[(last_speaker_index + 1) % len(agent_names)]
+
+
+async def _agent_turn(state: ConversationState, *, emit_chunks: bool):
+    """Shared implementation of one speaking turn.
+
+    Both public nodes were byte-for-byte copies apart from whether stream
+    chunks are surfaced; keeping one body means one copy of the recovery,
+    fallback, and bookkeeping logic runs (and is maintained) per turn.
+    """
     speaker_name = state["next_speaker"]
     agent_names = list(state["agent_states"].keys())
 
     if speaker_name not in agent_names and speaker_name != "Conclusion":
         print(f"[Warning] Invalid next_speaker: '{speaker_name}'. Using round-robin.")
-        last_speaker_name = state["full_transcript"][-1].split(":")[0].strip("[]").split(" ")[-1]
-        last_speaker_index = agent_names.index(last_speaker_name)
-        next_speaker_index = (last_speaker_index + 1) % len(agent_names)
-        speaker_name = agent_names[next_speaker_index]
+        speaker_name = _choose_round_robin_speaker(state, agent_names)
         state["next_speaker"] = speaker_name
 
     current_agent_state = state["agent_states"][speaker_name]
-    agent = ConversationalAgent(current_agent_state, state["topic"], agent_names)
+    agent = ConversationalAgent.get(speaker_name, current_agent_state, state["topic"], agent_names)
+
+    # If this turn will trigger a facilitator check, start the evaluation
+    # now so its LLM round-trip overlaps the agent's streaming window.
+    # The facilitator only sees state up to the previous turn, which is
+    # acceptable for an interrupt-or-continue heuristic.
+    stale_task = state.get("pending_facilitator_task")
+    if stale_task is not None:
+        stale_task.cancel()
+        state["pending_facilitator_task"] = None
+    if (state["current_turn"] + 1) % state["facilitator_check_interval"] == 0:
+        state["pending_facilitator_task"] = asyncio.create_task(_cached_facilitator(state))
 
     # Stream the agent's response
     decision = None
     full_response_text = ""
-    
+
     try:
         async for event in agent.astream_decision():
             if event["type"] == "chunk":
                 content = event["content"]
                 full_response_text += content
-                yield {"type": "agent_message_chunk", "agent_name": speaker_name, "chunk": content}
+                if emit_chunks:
+                    yield {"type": "agent_message_chunk", "agent_name": speaker_name, "chunk": content}
+            elif event["type"] == "next_agent_hint":
+                # Pre-warm the predicted next speaker while this stream
+                # finishes; on a correct prediction its pooled instance and
+                # static input are already built when the turn routes.
+                hinted = event["next_agent"]
+                if hinted in agent_names and hinted != speaker_name:
+                    ConversationalAgent.get(hinted, state["agent_states"][hinted], state["topic"], agent_names)
             elif event["type"] == "complete":
                 decision = event["decision"]
                 break
     except Exception as e:
         print(f"Streaming failed for {speaker_name}, falling back to non-streaming: {e}")
-        # Fallback to non-streaming
-        decision = await agent.chain.ainvoke({
-            "persona": agent.agent_state["persona"],
-            "subjective_view": agent.agent_state["subjective_view"],
-            "topic": agent.topic,
-            "agent_names_str": ", ".join(agent.all_agent_names),
-            "chat_history": agent.agent_state["chat_history"],
-        })
-    
+
     if decision is None:
-        # Emergency fallback
-        print(f"No decision received from {speaker_name}, creating emergency response")
-        from pydantic import BaseModel
-        class EmergencyDecision(BaseModel):
-            thoughts: str = "Unable to generate proper response"
-            response: str = full_response_text if full_response_text.strip() else "I need more time to think about this topic."
-            next_agent: str = agent_names[0] if agent_names else "Conclusion"
-            ready_to_conclude: bool = False
-        decision = EmergencyDecision()
-
-    # Process the decision
-    ai_message = AIMessage(content=decision.response, name=speaker_name)
-    human_message = HumanMessage(content=f"（{speaker_name}の発言）: {decision.response}", name="human")
-
-    for name, agent_state in state["agent_states"].items():
-        if name == speaker_name:
-            agent_state["chat_history"].append(ai_message)
-        else:
-            agent_state["chat_history"].append(human_message)
+        # Fallback to the non-streaming structured chain
+        try:
+            decision = await agent.chain.ainvoke({
+                **agent._static_input,
+                "chat_history": agent._prepared_history(),
+            })
+        except Exception as e:
+            print(f"No decision received from {speaker_name}, creating emergency response: {e}")
+            decision = EmergencyDecision(
+                response=full_response_text if full_response_text.strip() else "I need more time to think about this topic.",
+                next_agent=agent_names[0] if agent_names else "Conclusion",
+            )
+
+    # Signal completion of agent's turn before any bookkeeping, so the
+    # orchestrator surfaces the finished message immediately; the
+    # history/transcript/logging work below then runs off the event loop.
+    yield {"type": "agent_message_complete", "agent_name": speaker_name, "message": decision.response}
 
-    state["next_speaker"] = decision.next_agent
-    state["current_turn"] += 1
-    state["ready_flags"].append(decision.ready_to_conclude)
-    
-    if any(marker in decision.response for marker in ["どう思う？", "どう考える？", "意見を聞かせて", "君はどう", "あなたはどう"]):
-        question = f"{speaker_name}: {decision.response.split('？')[0]}？"
-        if question not in state["pending_questions"]:
-            state["pending_questions"].append(question)
-        
-        # Prevent self-nomination if a question was just asked
-        if decision.next_agent == speaker_name:
-            other_agents = [name for name in agent_names if name != speaker_name]
-            if other_agents:
-                import random
-                decision.next_agent = random.choice(other_agents)
-                print(f" -> [DEBUG] {speaker_name} tried to self-nominate after asking a question. Redirecting to {decision.next_agent}")
-    
-    turn_log = f"[Turn {state['current_turn']}] {speaker_name}: {decision.response}"
-    state["full_transcript"].append(turn_log)
-    state["logger"].info(turn_log)
-    print(turn_log)
-    print(f" -> Next Speaker: {decision.next_agent}")
+    turn_before_increment = state["current_turn"]
+    await asyncio.to_thread(_finalize_turn, state, decision, speaker_name, agent_names)
 
-    # Signal completion of agent's turn
-    yield {"type": "agent_message_complete", "agent_name": speaker_name, "message": decision.response}
+    # Periodically fold turns that left the bounded history window into
+    # the rolling summary (fire-and-forget, off the hot path). History is
+    # shared, so one summarizer call covers every agent.
+    if turn_before_increment and turn_before_increment % _SUMMARY_REFRESH_INTERVAL == 0:
+        asyncio.create_task(_refresh_shared_summary(state))
 
-async def agent_node(state: ConversationState) -> ConversationState:
-    """Executes the current speaker's turn asynchronously with streaming."""
-    speaker_name = state["next_speaker"]
-    agent_names = list(state["agent_states"].keys())
 
-    if speaker_name not in agent_names and speaker_name != "Conclusion":
-        print(f"[Warning] Invalid next_speaker: '{speaker_name}'. Using round-robin.")
-        last_speaker_name = state["full_transcript"][-1].split(":")[0].strip("[]").split(" ")[-1]
-        last_speaker_index = agent_names.index(last_speaker_name)
-        next_speaker_index = (last_speaker_index + 1) % len(agent_names)
-        speaker_name = agent_names[next_speaker_index]
-        state["next_speaker"] = speaker_name
+async def _refresh_shared_summary(state: ConversationState) -> None:
+    """Summarize the shared history once and fan the text out to all agents."""
+    agent_states = list(state["agent_states"].values())
+    if not agent_states:
+        return
+    await update_history_summary(agent_states[0])
+    summary = agent_states[0].get("history_summary", "")
+    for agent_state in agent_states[1:]:
+        agent_state["history_summary"] = summary
 
-    current_agent_state = state["agent_states"][speaker_name]
-    agent = ConversationalAgent(current_agent_state, state["topic"], agent_names)
 
-    # Use streaming decision method
-    decision = None
-    async for event in agent.astream_decision():
-        if event["type"] == "chunk":
-            # This will be caught by orchestrator streaming events
-            pass
-        elif event["type"] == "complete":
-            decision = event["decision"]
-            break
-    
-    if decision is None:
-        # Fallback to non-streaming if streaming fails
-        decision = await agent.chain.ainvoke({
-            "persona": agent.agent_state["persona"],
-            "subjective_view": agent.agent_state["subjective_view"],
-            "topic": agent.topic,
-            "agent_names_str": ", ".join(agent.all_agent_names),
-            "chat_history": agent.agent_state["chat_history"],
-        })
+def _finalize_turn(state: ConversationState, decision, speaker_name: str, agent_names: List[str]) -> None:
+    """Post-decision bookkeeping for one turn (run via asyncio.to_thread).
 
-    ai_message = AIMessage(content=decision.response, name=speaker_name)
-    human_message = HumanMessage(content=f"（{speaker_name}の発言）: {decision.response}", name="human")
+    Pure state mutation, printing, and file logging — no awaits — so it
+    can overlap with the loop scheduling the next node.
+    """
+    # One append to the shared history; agents materialize their own
+    # role-tagged view of it at prompt-build time.
+    state["global_history"].append({"speaker": speaker_name, "text": decision.response})
 
-    for name, agent_state in state["agent_states"].items():
-        if name == speaker_name:
-            agent_state["chat_history"].append(ai_message)
-        else:
-            agent_state["chat_history"].append(human_message)
+    # Buffer for the batched convergence embedding; only the newest few
+    # statements matter, so the buffer never grows past the batch cap.
+    state["unembedded_statements"].append(decision.response)
+    del state["unembedded_statements"][:-_EMBED_BATCH_MAX]
 
     state["next_speaker"] = decision.next_agent
     state["current_turn"] += 1
-    state["ready_flags"].append(decision.ready_to_conclude)
-    
-    if any(marker in decision.response for marker in ["どう思う？", "どう考える？", "意見を聞かせて", "君はどう", "あなたはどう"]):
+    # Flags live in a preallocated uint8 buffer indexed by ready_total;
+    # the incremental counters mean readers never re-sum it.
+    if state["ready_total"] < len(state["ready_flags"]):
+        state["ready_flags"][state["ready_total"]] = decision.ready_to_conclude
+    state["ready_count"] += int(decision.ready_to_conclude)
+    state["ready_total"] += 1
+
+    if _contains_question_marker(decision.response):
         question = f"{speaker_name}: {decision.response.split('？')[0]}？"
-        if question not in state["pending_questions"]:
-            state["pending_questions"].append(question)
-        
+        # Dict-backed: O(1) dedup on insert, O(1) removal when answered.
+        state["pending_questions"].setdefault(question, speaker_name)
+
         # Prevent self-nomination if a question was just asked
         if decision.next_agent == speaker_name:
             other_agents = [name for name in agent_names if name != speaker_name]
             if other_agents:
-                import random
                 decision.next_agent = random.choice(other_agents)
+                state["next_speaker"] = decision.next_agent
                 print(f" -> [DEBUG] {speaker_name} tried to self-nominate after asking a question. Redirecting to {decision.next_agent}")
-    
+
+    state["last_speaker"] = speaker_name
     turn_log = f"[Turn {state['current_turn']}] {speaker_name}: {decision.response}"
     state["full_transcript"].append(turn_log)
+    transcript_buffer = state.get("transcript_buffer")
+    if transcript_buffer is not None:
+        transcript_buffer.write(turn_log + "\n")
     state["logger"].info(turn_log)
     print(turn_log)
     print(f" -> Next Speaker: {decision.next_agent}")
 
+
+async def agent_node_streaming(state: ConversationState):
+    """Executes the current speaker's turn with streaming output."""
+    async for event in _agent_turn(state, emit_chunks=True):
+        yield event
+
+async def agent_node(state: ConversationState) -> ConversationState:
+    """Executes the current speaker's turn asynchronously."""
+    async for _ in _agent_turn(state, emit_chunks=False):
+        pass
     return state
 
 async def update_metrics_node(state: ConversationState) -> ConversationState:
-    """Updates monitoring metrics asynchronously."""
+    """Updates monitoring metrics asynchronously.
+
+    Embedding requests are pipelined: the task started after turn N runs
+    concurrently with turn N+1's LLM call and is only awaited here, just
+    before routing — the network RTT leaves the critical path. The
+    convergence score therefore lags one turn, which is fine for a
+    termination heuristic.
+    """
     current_turn = state["current_turn"]
-    if current_turn > 0:
-        latest_statement = state["full_transcript"][-1]
-        spoken_content = latest_statement.split(": ", 1)[1] if ": " in latest_statement else latest_statement
+
+    # Harvest the embedding kicked off after the previous turn.
+    pending_task = state.get("pending_embedding_task")
+    if pending_task is not None:
         try:
-            latest_embedding = await embeddings.aembed_query(spoken_content)
-            state["statement_embeddings"].append(latest_embedding)
-            
-            if len(state["statement_embeddings"]) >= 2:
-                last_embedding = state["statement_embeddings"][-1]
-                prev_embedding = state["statement_embeddings"][-2]
-                dot_product = np.dot(last_embedding, prev_embedding)
-                magnitude_1 = np.linalg.norm(last_embedding)
-                magnitude_2 = np.linalg.norm(prev_embedding)
-                state["convergence_score"] = max(0.0, dot_product / (magnitude_1 * magnitude_2)) if magnitude_1 > 0 and magnitude_2 > 0 else 0.0
+            new_embeddings = await pending_task
+            # Normalize once on insert (float32): cosine similarity between
+            # any two stored vectors is then a single dot product.
+            # Rows live in one preallocated float32 matrix (lazily sized on
+            # the first vector, since the dimension depends on the backend)
+            # so per-turn work is a row write plus one contiguous dot —
+            # no list-of-arrays indirection, and an all-pairs pass later is
+            # just matrix @ matrix.T over the filled rows.
+            matrix = state["statement_embeddings"]
+            for latest_embedding in new_embeddings:
+                vec = np.asarray(latest_embedding, dtype=np.float32)
+                vec /= np.linalg.norm(vec) + 1e-12
+                if matrix is None:
+                    matrix = np.empty((state["max_turns"] + 1, vec.shape[0]), dtype=np.float32)
+                    state["statement_embeddings"] = matrix
+                n = state["n_embeddings"]
+                if n < matrix.shape[0]:
+                    matrix[n] = vec
+                    state["n_embeddings"] = n + 1
+
+            n = state["n_embeddings"]
+            if n >= 2:
+                state["convergence_score"] = max(0.0, float(matrix[n - 1] @ matrix[n - 2]))
             else:
                 state["convergence_score"] = 0.0
         except Exception as e:
             print(f"[Warning] Failed to calculate embedding: {e}")
             state["convergence_score"] = 0.0
-    
-    ready_count = sum(state["ready_flags"])
-    total_flags = len(state["ready_flags"])
+        state["pending_embedding_task"] = None
+
+    # Kick off this turn's embedding; it overlaps with the next LLM call.
+    # Gated three ways: routing only consults convergence in the endgame
+    # (last few turns with a largely-ready roster), a minimum turn count,
+    # and a token-Jaccard prefilter — so most turns never pay for an
+    # embedding at all. Convergence is advisory; outside the gate it
+    # simply reads 0.0.
+    if current_turn > 0 and state["full_transcript"]:
+        latest_statement = state["full_transcript"][-1]
+        # partition avoids the list allocation of split and scans once.
+        _prefix, sep, spoken_content = latest_statement.partition(": ")
+        if not sep:
+            spoken_content = latest_statement
+        tokens = set(_WORD_RE.findall(spoken_content))
+        prev_tokens = state.get("last_tokens") or set()
+        state["last_tokens"] = tokens
+        union = tokens | prev_tokens
+        jaccard = len(tokens & prev_tokens) / len(union) if union else 0.0
+        readiness_ratio = state["ready_count"] / state["ready_total"] if state["ready_total"] else 0.0
+        routing_could_care = (
+            state["max_turns"] - current_turn <= 3 and readiness_ratio > 0.8
+        )
+        if (
+            not routing_could_care
+            or current_turn < MIN_TURNS_BEFORE_CONVERGENCE_CHECK
+            or jaccard < _JACCARD_PREFILTER_THRESHOLD
+        ):
+            state["convergence_score"] = 0.0
+        else:
+            # Everything buffered since the last batch goes out in one
+            # aembed_documents request (capped at _EMBED_BATCH_MAX).
+            batch = state["unembedded_statements"][-_EMBED_BATCH_MAX:]
+            state["unembedded_statements"] = []
+            if batch:
+                state["pending_embedding_task"] = asyncio.create_task(_embed_statements(batch))
+
+
+    ready_count = state["ready_count"]
+    total_flags = state["ready_total"]
     readiness_ratio = ready_count / total_flags if total_flags > 0 else 0.0
     
     current_speaker = state["next_speaker"]
     latest_statement = state["full_transcript"][-1] if state["full_transcript"] else ""
-    answered_questions = [q for q in state["pending_questions"] if q.split(":")[0] != current_speaker and current_speaker in latest_statement]
+    answered_questions = [q for q, asker in state["pending_questions"].items() if asker != current_speaker and current_speaker in latest_statement]
     for answered in answered_questions:
-        state["pending_questions"].remove(answered)
+        del state["pending_questions"][answered]
     
     total_questions_asked = state["current_turn"] - len(state["pending_questions"])
     state["discussion_depth"] = total_questions_asked / max(1, state["current_turn"])
     
+    # Rendered here once per turn; the facilitator (and its speculative
+    # launch) read it instead of re-slicing and re-joining the transcript.
+    state["recent_turns_text"] = "\n".join(state["full_transcript"][-3:])
+
     pending_count = len(state["pending_questions"])
     print(f" -> Metrics: Convergence: {state['convergence_score']:.3f}, Readiness: {ready_count}/{total_flags} ({readiness_ratio:.3f}), Depth: {state['discussion_depth']:.3f}, Pending Q: {pending_count}")
-    
+
     return state
 
-async def facilitator_node(state: ConversationState) -> ConversationState:
-    """Facilitator evaluates the debate asynchronously."""
-    print("\n--- Facilitator Evaluation ---")
-    ready_count = sum(state["ready_flags"])
-    total_flags = len(state["ready_flags"])
+def _facilitator_input(state: ConversationState) -> dict:
+    """Assemble the facilitator chain's input dict from current state."""
+    ready_count = state["ready_count"]
+    total_flags = state["ready_total"]
     readiness_ratio = ready_count / total_flags if total_flags > 0 else 0.0
-    recent_turns = state["full_transcript"][-3:] if len(state["full_transcript"]) >= 3 else state["full_transcript"]
-    
-    facilitator_prompt = ChatPromptTemplate.from_messages([
-        SystemMessage(content="""あなたは議論のファシリテータです。議論全体を俯瞰し、以下の情報を元に最適な次のアクションを決定してください。
+    recent_turns_text = state.get("recent_turns_text") or "\n".join(state["full_transcript"][-3:])
+
+    return {
+        "topic": state["topic"],
+        "current_turn": state["current_turn"],
+        "max_turns": state["max_turns"],
+        "progress_pct": f"{(state['current_turn'] / state['max_turns'] * 100):.1f}",
+        "convergence_score": f"{state['convergence_score']:.3f}",
+        "readiness_ratio": f"{readiness_ratio:.3f}",
+        "ready_count": ready_count,
+        "total_flags": total_flags,
+        "discussion_depth": f"{state['discussion_depth']:.3f}",
+        "pending_count": len(state["pending_questions"]),
+        "pending_questions": "\n".join(state["pending_questions"]) if state["pending_questions"] else "なし",
+        "recent_turns": recent_turns_text,
+    }
+
+
+async def _run_facilitator(facilitator_input: dict) -> FacilitatorDecision:
+    """Run the facilitator chain to a complete decision."""
+    full_decision = FacilitatorDecision(action="", reasoning="", message="")
+    async for chunk in _FACILITATOR_CHAIN.astream(facilitator_input):
+        if chunk.action is not None: full_decision.action = chunk.action
+        if chunk.reasoning is not None: full_decision.reasoning = chunk.reasoning
+        if chunk.message is not None: full_decision.message = chunk.message
+    return full_decision
 
-**利用可能なアクション:**
-- "continue": 議論を継続させる（まだ議論が浅い、または新しい視点が期待できる場合）
-- "propose_conclusion": 議論をまとめるフェーズへの移行を提案する（十分に議論が深まった場合）
-- "call_vote": 意見が明確に分かれている場合に多数決を促す
 
-**判断基準（人間らしい会話を最優先）:**
-1. **NEVER interrupt if there are pending questions** - 質問が残っている場合は絶対に継続
-2. **Continue if discussion_depth < 0.7** - 議論の深さが不十分な場合は継続
-3. **Continue if current_turn < max_turns * 0.6** - 最大ターンの60%未満は基本的に継続
-4. 議論が真に停滞している場合（同じ論点の3回以上の反復）のみ "propose_conclusion"
-5. 準備完了率 > 80% かつ 残りターン < 3 の場合のみ "propose_conclusion"
+# Facilitator decisions recur when the debate has barely moved between
+# checks. Entries are bucketed by coarse structural features and matched
+# on a local embedding of the recent transcript, mirroring the agents'
+# semantic decision cache; without the local encoder (or on any cache
+# error) every call goes straight to the LLM.
+_FACILITATOR_CACHE_THRESHOLD = 0.97
+_FACILITATOR_CACHE_MAX = 64
+_facilitator_cache: dict = {}
 
-議論のテーマ: {topic}"""),
-        HumanMessage(content=f"""
-**現在の議論状況:**
-- 現在のターン: {state['current_turn']} / {state['max_turns']}
-- 議論の進行率: {(state['current_turn'] / state['max_turns'] * 100):.1f}%
-- 収束スコア: {state['convergence_score']:.3f}
-- 準備完了率: {readiness_ratio:.3f} ({ready_count}/{total_flags})
-- 議論の深さ: {state['discussion_depth']:.3f}
-- 未回答の質問数: {len(state['pending_questions'])}
 
-**未回答の質問:**
-{chr(10).join(state['pending_questions']) if state['pending_questions'] else "なし"}
+def _facilitator_coarse_key(state: ConversationState) -> tuple:
+    total = state["ready_total"]
+    ratio = state["ready_count"] / total if total else 0.0
+    return (state["current_turn"] // 4, round(ratio, 1), len(state["pending_questions"]))
 
-**直近の議論内容:**
-{chr(10).join(recent_turns)}
 
-**重要:** 未回答の質問がある場合は必ず "continue" を選択してください。議論の自然な流れを最優先してください。
-""")
-    ])
-    
-    facilitator_llm = llm.with_structured_output(FacilitatorDecision)
-    facilitator_chain = facilitator_prompt | facilitator_llm
-    
-    full_decision = FacilitatorDecision(action="", reasoning="", message="")
-    async for chunk in facilitator_chain.astream({"topic": state["topic"]}):
-        if chunk.action is not None: full_decision.action = chunk.action
-        if chunk.reasoning is not None: full_decision.reasoning = chunk.reasoning
-        if chunk.message is not None: full_decision.message = chunk.message
-    decision = full_decision
-    
+async def _cached_facilitator(state: ConversationState) -> FacilitatorDecision:
+    """Facilitator decision with a coarse-key + cosine semantic cache."""
+    encoder = get_local_encoder()
+    if encoder is None:
+        return await _run_facilitator(_facilitator_input(state))
+
+    try:
+        signature = state.get("recent_turns_text") or "\n".join(state["full_transcript"][-3:])
+        vec = await asyncio.to_thread(encoder.encode, signature, normalize_embeddings=True)
+        key = _facilitator_coarse_key(state)
+        entries = _facilitator_cache.get(key)
+        if entries:
+            sims = np.stack([v for v, _ in entries]) @ vec
+            best = int(np.argmax(sims))
+            if float(sims[best]) >= _FACILITATOR_CACHE_THRESHOLD:
+                return entries[best][1]
+    except Exception:
+        return await _run_facilitator(_facilitator_input(state))
+
+    decision = await _run_facilitator(_facilitator_input(state))
+    entries = _facilitator_cache.setdefault(key, [])
+    entries.append((vec, decision))
+    if len(entries) > _FACILITATOR_CACHE_MAX:
+        del entries[0]
+    return decision
+
+
+async def facilitator_node(state: ConversationState) -> ConversationState:
+    """Facilitator evaluates the debate asynchronously."""
+    print("\n--- Facilitator Evaluation ---")
+    # Prefer the decision speculatively started alongside the turn that
+    # just finished; its round-trip has been overlapping the agent's
+    # streaming window instead of blocking here.
+    pending_task = state.get("pending_facilitator_task")
+    state["pending_facilitator_task"] = None
+    if pending_task is not None:
+        try:
+            decision = await pending_task
+        except Exception as e:
+            print(f"[Warning] Speculative facilitator call failed, rerunning inline: {e}")
+            decision = await _cached_facilitator(state)
+    else:
+        decision = await _cached_facilitator(state)
+
     state["facilitator_action"] = decision.action
     state["facilitator_message"] = decision.message
     print(f"Facilitator Decision: {decision.action}")
@@ -297,28 +621,11 @@ async def facilitator_node(state: ConversationState) -> ConversationState:
 async def pre_conclusion_node(state: ConversationState) -> ConversationState:
     """Generates a preliminary conclusion asynchronously."""
     print("\n--- Pre-Conclusion: Preparing Draft Summary ---")
-    prompt = ChatPromptTemplate.from_messages([
-        SystemMessage(content="""あなたは議論のファシリテータです。これまでの議論をまとめて、暫定的な結論案を作成してください。
-
-**重要な指示:**
-1. 議論全体を客観的に要約してください
-2. 主要な論点とそれぞれの立場を明確に記述してください
-3. 合意に至った点と意見が分かれた点を区別してください
-4. 「これはまだ暫定的なまとめです」ということを明記してください
-5. 参加者に補足や修正意見を求めてください
-
-議論のテーマ: {topic}"""),
-        HumanMessage(content=f"""
-以下の議論の記録を基に、暫定的な結論案を作成してください：
-
-{chr(10).join(state['full_transcript'])}
-
-上記の議論を踏まえ、暫定的なまとめを作成し、参加者に最終確認を求めてください。
-""")
-    ])
-    chain = prompt | llm
     full_response = ""
-    async for chunk in chain.astream({"topic": state["topic"]}):
+    async for chunk in _PRE_CONCLUSION_CHAIN.astream({
+        "topic": state["topic"],
+        "transcript": _transcript_text(state),
+    }):
         if isinstance(chunk.content, list):
             # Handle OpenAI Responses API format
             chunk_text = ""
@@ -341,27 +648,12 @@ async def final_comment_node(state: ConversationState) -> ConversationState:
     async def get_comment(agent_name):
         print(f"\n--- {agent_name}の最終意見 ---")
         agent_state = state["agent_states"][agent_name]
-        prompt = ChatPromptTemplate.from_messages([
-            SystemMessage(content=f"""あなたは{agent_name}です。ファシリテータが作成した暫定的な結論案を確認し、最終的な意見を述べてください。
-
-**あなたの役割:** {agent_state['persona']}
-
-**指示:**
-1. 暫定的な結論案を読んで、内容が議論を適切に反映しているか確認してください
-2. 重要な論点の見落としや誤解がないかチェックしてください  
-3. 必要であれば補足や修正を提案してください
-4. 簡潔に（2-3文程度で）最終意見を述べてください
-5. もし結論案に満足している場合は、その旨を述べてください"""),
-            HumanMessage(content=f"""
-**暫定的な結論案:**
-{state['preliminary_conclusion']}
-
-上記の結論案について、あなたの最終的な意見を述べてください。重要な見落としや修正が必要な点があれば指摘し、なければ結論案への賛同を表明してください。
-""")
-        ])
-        chain = prompt | llm
         full_comment = ""
-        async for chunk in chain.astream({}):
+        async for chunk in _FINAL_COMMENT_CHAIN.astream({
+            "agent_name": agent_name,
+            "persona": agent_state["persona"],
+            "preliminary_conclusion": state["preliminary_conclusion"],
+        }):
             if isinstance(chunk.content, list):
                 # Handle OpenAI Responses API format
                 chunk_text = ""
@@ -385,38 +677,20 @@ async def conclusion_node(state: ConversationState) -> ConversationState:
     """Generates the final conclusion asynchronously."""
     print("\n--- Generating Final Conclusion ---")
     if state["preliminary_conclusion"] and state["final_comments"]:
-        prompt = ChatPromptTemplate.from_messages([
-            SystemMessage(content=f"""あなたは議論の結論をまとめる専門家です。以下の情報を統合して、最終的な結論を作成してください。
-
-**重要な指示:**
-1. 暫定的な結論案を基礎として使用してください
-2. 参加者の最終意見を十分に考慮して、必要な修正や補足を行ってください
-3. 最終的な結論は包括的で、全ての重要な論点を含むようにしてください
-4. 意見が分かれた場合は、それも明確に記述してください
-
-議論のテーマ: {state["topic"]}"""),
-            HumanMessage(content=f"""
-**暫定的な結論案:**
-{state['preliminary_conclusion']}
-
-**参加者の最終意見:**
-{chr(10).join(state['final_comments'])}
-
-**完全な議論記録:**
-{chr(10).join(state['full_transcript'])}
-
-上記の情報を統合して、最終的な結論を作成してください。
-""")
-        ])
+        stream = _CONCLUSION_CHAIN.astream({
+            "topic": state["topic"],
+            "preliminary_conclusion": state["preliminary_conclusion"],
+            "final_comments": "\n".join(state["final_comments"]),
+            "transcript": _transcript_text(state),
+        })
     else:
-        prompt = ChatPromptTemplate.from_messages([
-            SystemMessage(content="あなたは議論の結論をまとめる専門家です。以下の議論の完全な記録を読み、最終的な結論を客観的に要約してください。意見が分かれた場合は、それも明確に記述してください。議論のテーマ:" + state["topic"]),
-            HumanMessage(content="\n".join(state["full_transcript"])) 
-        ])
-    
-    chain = prompt | llm
+        stream = _SIMPLE_CONCLUSION_CHAIN.astream({
+            "topic": state["topic"],
+            "transcript": _transcript_text(state),
+        })
+
     full_conclusion = ""
-    async for chunk in chain.astream({}):
+    async for chunk in stream:
         if isinstance(chunk.content, list):
             # Handle OpenAI Responses API format
             chunk_text = ""
@@ -430,6 +704,27 @@ async def conclusion_node(state: ConversationState) -> ConversationState:
     print(f"Final Conclusion: {state['conclusion']}")
     return state
 
+def _transcript_text(state: ConversationState) -> str:
+    """Full transcript as one string — O(1) when the incremental buffer
+    is present, falling back to joining the list for older callers."""
+    transcript_buffer = state.get("transcript_buffer")
+    if transcript_buffer is not None:
+        return transcript_buffer.getvalue()
+    return "\n".join(state["full_transcript"])
+
+
+async def turn_node(state: ConversationState) -> ConversationState:
+    """Fused agent turn + metrics update.
+
+    Every LangGraph edge costs a state serialization/checkpoint pass, and
+    the metrics body is trivial numeric work — fusing the two nodes
+    halves per-turn state IO, which matters once the state carries
+    growing transcripts and embedding lists.
+    """
+    state = await agent_node(state)
+    return await update_metrics_node(state)
+
+
 # --- Conditional Routing (remains synchronous) ---
 def route_after_metrics(state: ConversationState) -> str:
     if state["next_speaker"] == "Conclusion": return "conclusion_node"
@@ -439,8 +734,8 @@ def route_after_metrics(state: ConversationState) -> str:
         return "agent_node"
     if state["current_turn"] > 0 and state["current_turn"] % state["facilitator_check_interval"] == 0:
         return "facilitator_node"
-    ready_count = sum(state["ready_flags"])
-    total_flags = len(state["ready_flags"])
+    ready_count = state["ready_count"]
+    total_flags = state["ready_total"]
     readiness_ratio = ready_count / total_flags if total_flags > 0 else 0.0
     remaining_turns = state["max_turns"] - state["current_turn"]
     if (state["convergence_score"] > 0.98 and readiness_ratio > 0.8 and remaining_turns <= 2 and state["discussion_depth"] > 0.7):
@@ -458,26 +753,46 @@ def route_after_facilitator(state: ConversationState) -> str:
         return "agent_node"
 
 # --- Graph Definition ---
-def create_debate_graph() -> StateGraph:
+def create_debate_graph(agent_names: List[str] = None) -> StateGraph:
+    # Pre-warm the per-roster decision model and chains at build time so
+    # the first turn doesn't pay for Pydantic schema compilation; later
+    # turns hit the same lru_cache through the agent pool.
+    if agent_names:
+        _build_chain(tuple(agent_names))
+
     workflow = StateGraph(ConversationState)
-    workflow.add_node("agent_node", agent_node)
-    workflow.add_node("update_metrics_node", update_metrics_node)
+    workflow.add_node("turn_node", turn_node)
     workflow.add_node("facilitator_node", facilitator_node)
     workflow.add_node("pre_conclusion_node", pre_conclusion_node)
     workflow.add_node("final_comment_node", final_comment_node)
     workflow.add_node("conclusion_node", conclusion_node)
-    workflow.set_entry_point("agent_node")
-    workflow.add_edge("agent_node", "update_metrics_node")
-    workflow.add_conditional_edges("update_metrics_node", route_after_metrics, {
-        "agent_node": "agent_node",
+    workflow.set_entry_point("turn_node")
+    workflow.add_conditional_edges("turn_node", route_after_metrics, {
+        "agent_node": "turn_node",
         "facilitator_node": "facilitator_node",
         "conclusion_node": "conclusion_node",
     })
     workflow.add_conditional_edges("facilitator_node", route_after_facilitator, {
-        "agent_node": "agent_node",
+        "agent_node": "turn_node",
         "pre_conclusion_node": "pre_conclusion_node",
     })
     workflow.add_edge("pre_conclusion_node", "final_comment_node")
     workflow.add_edge("final_comment_node", "conclusion_node")
     workflow.add_edge("conclusion_node", END)
     return workflow.compile()
+
+# Compiled graphs hold no per-debate state, so one per roster serves every
+# run in the process; compilation is paid once instead of per invocation.
+_COMPILED_APPS: dict = {}
+
+def _get_app(agent_names: List[str] = None):
+    """Returns a cached compiled debate graph for the given roster."""
+    key = tuple(agent_names) if agent_names else None
+    app = _COMPILED_APPS.get(key)
+    if app is None:
+        app = _COMPILED_APPS[key] = create_debate_graph(agent_names)
+    return app
+
+def _reset_app() -> None:
+    """Drops cached compiled graphs (for tests)."""
+    _COMPILED_APPS.clear()
@@ -3,98 +3,235 @@
 """
 Orchestrator with Subjective Views and Logging
 """
+import asyncio
+import atexit
+import functools
+import sys
 import time
 import os
 import logging
-from datetime import datetime
+import logging.handlers
+import queue
+import numpy as np
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# libuv-backed event loop: same asyncio API, noticeably less scheduler
+# overhead per awaited chunk when streaming many small deltas. Optional
+# (`pip install .[fast-loop]`), and unavailable on Windows.
+if uvloop is not None and sys.platform != "win32":
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+import itertools
+from collections import deque
+from io import StringIO
 from typing import List, Dict, Any
 from langchain_core.messages import SystemMessage
 
 from .state import ConversationState, AgentState
-from .graph import create_debate_graph
+from .agents import _coalesce, _extract_chunk_text
+from .graph import (
+    _CONCLUSION_CHAIN,
+    _FINAL_COMMENT_CHAIN,
+    _PRE_CONCLUSION_CHAIN,
+    _SIMPLE_CONCLUSION_CHAIN,
+    _transcript_text,
+    agent_node_streaming,
+    conclusion_node,
+    create_debate_graph,
+    facilitator_node,
+    final_comment_node,
+    pre_conclusion_node,
+    route_after_facilitator,
+    route_after_metrics,
+    update_metrics_node,
+)
 from .config import AGENTS_CONFIG # Import the single source of truth
 
+# Monotonic suffix keeps log filenames (and logger names) unique even when
+# several debates launch within the same wall-clock second.
+_LOG_COUNTER = itertools.count()
+
+def _stop_log_listener(listener):
+    """Idempotent QueueListener.stop — safe from both finally and atexit."""
+    if listener._thread is not None:
+        listener.stop()
+
 def setup_debate_logger(log_dir="logs"):
     """Sets up a logger for the debate transcript."""
     os.makedirs(log_dir, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    timestamp = f"{time.strftime('%Y%m%d_%H%M%S')}_{next(_LOG_COUNTER):04d}"
     log_filename = os.path.join(log_dir, f"debate_{timestamp}.log")
     
-    handler = logging.FileHandler(log_filename, encoding='utf-8')
+    # Rotation caps runaway transcripts: at most ~300 MB per debate log
+    # (active file + 5 backups) even for unexpectedly verbose runs.
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_filename, maxBytes=50 * 1024 * 1024, backupCount=5, encoding='utf-8'
+    )
     formatter = logging.Formatter('%(asctime)s - %(message)s')
-    handler.setFormatter(formatter)
-    
+    file_handler.setFormatter(formatter)
+
+    # Buffer records in memory and flush in batches: one syscall per ~512
+    # records instead of one per logger.info call on the event loop.
+    # ERRORs flush immediately so crash context always hits disk.
+    mem_handler = logging.handlers.MemoryHandler(
+        capacity=512, flushLevel=logging.ERROR, target=file_handler
+    )
+
+    # Hand records off to a writer thread: logger.info from graph nodes
+    # becomes an O(1) queue put, so file I/O never stalls the event loop.
+    log_queue: queue.Queue = queue.Queue(-1)
+    listener = logging.handlers.QueueListener(log_queue, mem_handler)
+    listener.start()
+
     logger = logging.getLogger(f"debate_logger_{timestamp}")
     logger.setLevel(logging.INFO)
-    logger.addHandler(handler)
-    
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    # Stashed on the logger so run_graph's finally (and atexit) can drain
+    # the queue without changing this function's return signature.
+    logger._debate_queue_listener = listener
+    atexit.register(_stop_log_listener, listener)
+    # Interpreter exit also flushes via logging.shutdown(), but register
+    # explicitly so the buffered tail survives abrupt teardown ordering.
+    atexit.register(mem_handler.flush)
+
     return logger
 
+@functools.lru_cache(maxsize=None)
+def _subjective_perspective_cached(my_name: str, views: tuple) -> str:
+    """Renders a frozen (target, view) tuple into the prompt fragment."""
+    return "\n".join(f"- {target_name}: {view}" for target_name, view in views)
+
+# Rendered once at import: AGENTS_CONFIG is static, so building the roster
+# is a dict lookup per agent instead of a linear config scan per agent.
+_SUBJECTIVE_VIEWS = {
+    agent["name"]: "\n".join(
+        f"- {target_name}: {view}"
+        for target_name, view in agent.get("subjective_views", {}).items()
+    )
+    for agent in AGENTS_CONFIG
+}
+
 def get_subjective_perspective_from_config(my_name: str, all_agents_config: List[Dict[str, Any]]) -> str:
     """Generates a subjective description of other agents from the config."""
+    if all_agents_config is AGENTS_CONFIG:
+        return _SUBJECTIVE_VIEWS.get(my_name, "")
+
     my_config = next((agent for agent in all_agents_config if agent["name"] == my_name), None)
     if not my_config or "subjective_views" not in my_config:
         return ""
-    
-    descriptions = []
-    for target_name, view in my_config["subjective_views"].items():
-        descriptions.append(f"- {target_name}: {view}")
-    return "\n".join(descriptions)
 
-async def run_graph(topic: str, max_turns: int = 10):
-    """Direct streaming wrapper for running the debate."""
-    
-    logger = setup_debate_logger()
-    
-    agent_names = [agent["name"] for agent in AGENTS_CONFIG]
-    initial_speaker = agent_names[0] if agent_names else ""
+    # Custom configs never change within a process either, so the rendered
+    # string is memoized on the frozen views.
+    return _subjective_perspective_cached(my_name, tuple(my_config["subjective_views"].items()))
 
-    agent_states = {}
-    for agent_config in AGENTS_CONFIG:
-        agent_name = agent_config["name"]
-        subjective_view = get_subjective_perspective_from_config(agent_name, AGENTS_CONFIG)
-        agent_states[agent_name] = AgentState(
-            name=agent_name,
-            persona=agent_config["persona"],
-            chat_history=[],
-            subjective_view=subjective_view
-        )
+# Scalar/immutable ConversationState defaults, shared by every entry point.
+# Mutable containers are allocated fresh per debate in _build_initial_state.
+_DEFAULT_FIELDS = dict(
+    last_speaker="",
+    current_turn=0,
+    conclusion=None,
+    convergence_score=0.0,
+    ready_count=0,
+    ready_total=0,
+    statement_embeddings=None,
+    n_embeddings=0,
+    facilitator_check_interval=8,
+    facilitator_action=None,
+    facilitator_message=None,
+    preliminary_conclusion=None,
+    discussion_depth=0.0,
+)
 
-    state = ConversationState(
+def _build_initial_state(topic, agent_states, global_history, initial_speaker,
+                         max_turns, logger) -> ConversationState:
+    """Builds a fresh ConversationState for one debate run."""
+    return ConversationState(
+        **_DEFAULT_FIELDS,
         topic=topic,
         agent_states=agent_states,
+        global_history=global_history,
         next_speaker=initial_speaker,
-        current_turn=0,
         max_turns=max_turns,
-        conclusion=None,
         full_transcript=[],
+        transcript_buffer=StringIO(),
         logger=logger,
-        convergence_score=0.0,
-        ready_flags=[],
-        statement_embeddings=[],
-        facilitator_check_interval=8,
-        facilitator_action=None,
-        facilitator_message=None,
-        preliminary_conclusion=None,
+        # +1 slot: a turn can still complete at current_turn == max_turns.
+        ready_flags=np.zeros(max_turns + 1, dtype=np.uint8),
+        unembedded_statements=[],
         final_comments=[],
-        topic_diversity=0.0,
-        discussion_depth=0.0,
-        pending_questions=[]
+        pending_questions={},
     )
 
-    # Import here to avoid circular imports
-    from .graph import agent_node_streaming, update_metrics_node, facilitator_node, pre_conclusion_node, final_comment_node, conclusion_node
-    from .graph import route_after_metrics, route_after_facilitator
+async def run_graph(topic: str, max_turns: int = 10,
+                    agents_config: List[Dict[str, Any]] = None):
+    """Direct streaming wrapper for running the debate.
 
+    agents_config defaults to AGENTS_CONFIG; callers with their own roster
+    (e.g. the MMLU scoring agents) pass it here instead of monkeypatching
+    the config module.
+    """
+
+    # Python 3.12+: start tasks eagerly so coroutines that finish without
+    # suspending (cache hits, trivial awaits) skip the scheduler hop.
+    # Not every loop supports custom task factories (e.g. uvloop) — any
+    # refusal just leaves the default behavior.
+    try:
+        asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
+    except (AttributeError, RuntimeError, NotImplementedError):
+        pass
+
+    # Logger setup touches the filesystem (makedirs + log-file open), so it
+    # runs on a worker thread while the agent states are assembled below.
+    logger_task = asyncio.create_task(asyncio.to_thread(setup_debate_logger))
+
+    if agents_config is None:
+        agents_config = AGENTS_CONFIG
+    agent_names = [agent["name"] for agent in agents_config]
+    initial_speaker = agent_names[0] if agent_names else ""
+
+    # One bounded history shared by every agent: turns are stored once as
+    # (speaker, text) entries and rendered per-agent at prompt-build time.
+    # Older turns are folded into history_summary by the graph's rolling
+    # summarizer instead of growing the prompt quadratically.
+    global_history = deque(maxlen=20)
+
+    agent_states = {}
+    for agent_config in agents_config:
+        agent_name = agent_config["name"]
+        subjective_view = get_subjective_perspective_from_config(agent_name, agents_config)
+        agent_states[agent_name] = AgentState(
+            name=agent_name,
+            persona=agent_config["persona"],
+            global_history=global_history,
+            subjective_view=subjective_view,
+            history_summary=""
+        )
+
+    logger = await logger_task
+
+    state = _build_initial_state(topic, agent_states, global_history,
+                                 initial_speaker, max_turns, logger)
+
+    metrics_task = None
     try:
         while state["current_turn"] < state["max_turns"] and state["next_speaker"] != "Conclusion":
             # Agent speaking turn with streaming
             async for event in agent_node_streaming(state):
                 yield event
-                
-            # Update metrics
-            state = await update_metrics_node(state)
-            
+
+            # Launch metric computation in the background so it overlaps
+            # the turn's trailing work (summary refresh, speculative
+            # facilitator call) and the consumer handling the yielded
+            # events. Routing depends on the metrics, so the task is
+            # awaited just before the route decision.
+            metrics_task = asyncio.create_task(update_metrics_node(state))
+
+            state = await metrics_task
+            metrics_task = None
+
             # Route decision
             next_step = route_after_metrics(state)
             
@@ -116,7 +253,8 @@ async def run_graph(topic: str, max_turns: int = 10):
                 yield event
             
             yield {"type": "status_update", "message": "--- Final Comments: Last Chance for Input ---"}
-            state = await final_comment_node(state)
+            async for event in final_comment_node_streaming(state):
+                yield event
             if state.get("final_comments"):
                 yield {"type": "final_comments_complete", "content": state["final_comments"]}
             
@@ -127,126 +265,150 @@ async def run_graph(topic: str, max_turns: int = 10):
     except Exception as e:
         print(f"Error in run_graph: {e}")
         yield {"type": "error", "message": str(e)}
-    
+    finally:
+        # Don't leave an in-flight metrics task dangling if the loop
+        # exits abnormally between create and await.
+        if metrics_task is not None and not metrics_task.done():
+            metrics_task.cancel()
+        # Drain the log queue and push any buffered records to disk
+        # before handing control back.
+        listener = getattr(logger, "_debate_queue_listener", None)
+        if listener is not None:
+            _stop_log_listener(listener)
+            for handler in listener.handlers:
+                handler.flush()
+        else:
+            for handler in logger.handlers:
+                handler.flush()
+
     yield {"type": "end_of_debate"}
 
+async def _collect_run_graph(topic: str, max_turns: int,
+                             agents_config=None) -> Dict[str, Any]:
+    """Consumes run_graph's event stream and assembles a result dict."""
+    result: Dict[str, Any] = {
+        "topic": topic,
+        "transcript": [],
+        "final_comments": [],
+        "conclusion": None,
+    }
+    async for event in run_graph(topic, max_turns=max_turns,
+                                 agents_config=agents_config):
+        event_type = event.get("type")
+        if event_type == "agent_message_complete":
+            result["transcript"].append(f"{event['agent_name']}: {event['message']}")
+        elif event_type == "final_comments_complete":
+            result["final_comments"] = event["content"]
+        elif event_type == "conclusion_complete":
+            result["conclusion"] = event["conclusion"]
+        elif event_type == "error":
+            result["error"] = event["message"]
+    return result
+
+def run_debate(topic: str, max_turns: int = 10, agents_config=None) -> Dict[str, Any]:
+    """Synchronous entry point for callers without an event loop.
+
+    Internally everything runs through the async streaming path, so LLM
+    calls within a turn (final comments, speculative facilitator checks,
+    batched embeddings) still overlap; only the top-level driver blocks.
+    """
+    # A dedicated loop (instead of asyncio.run) sidesteps interactions
+    # with any loop an embedding host may have set but not started, and
+    # picks up the uvloop policy installed above when available.
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(
+            _collect_run_graph(topic, max_turns, agents_config)
+        )
+    finally:
+        loop.close()
+
 # Helper streaming functions
-async def pre_conclusion_node_streaming(state):
-    """Streaming version of pre_conclusion_node."""
-    from .graph import llm
-    from langchain_core.prompts import ChatPromptTemplate
-    from langchain_core.messages import SystemMessage, HumanMessage
-    
-    prompt = ChatPromptTemplate.from_messages([
-        SystemMessage(content="""あなたは議論のファシリテータです。これまでの議論をまとめて、暫定的な結論案を作成してください。
+async def final_comment_node_streaming(state):
+    """Streaming version of final_comment_node.
 
-**重要な指示:**
-1. 議論全体を客観的に要約してください
-2. 主要な論点とそれぞれの立場を明確に記述してください
-3. 合意に至った点と意見が分かれた点を区別してください
-4. 「これはまだ暫定的なまとめです」ということを明記してください
-5. 参加者に補足や修正意見を求めてください
+    All agents' comment streams run concurrently and are multiplexed
+    through one queue, so the UI shows everyone typing at once instead
+    of waiting for the slowest full response.
+    """
+    agent_names = list(state["agent_states"].keys())
+    queue: asyncio.Queue = asyncio.Queue()
+    done_sentinel = object()
 
-議論のテーマ: {topic}"""),
-        HumanMessage(content=f"""
-以下の議論の記録を基に、暫定的な結論案を作成してください：
+    async def get_comment(agent_name):
+        agent_state = state["agent_states"][agent_name]
+        full_comment = ""
+        try:
+            async for chunk in _FINAL_COMMENT_CHAIN.astream({
+                "agent_name": agent_name,
+                "persona": agent_state["persona"],
+                "preliminary_conclusion": state["preliminary_conclusion"],
+            }):
+                chunk_text = _extract_chunk_text(chunk.content)
+                if chunk_text:
+                    full_comment += chunk_text
+                    await queue.put((agent_name, chunk_text))
+        finally:
+            await queue.put((agent_name, done_sentinel))
+        state["logger"].info(f"Final comment from {agent_name}: {full_comment}")
+        return f"[{agent_name}] {full_comment}"
 
-{chr(10).join(state['full_transcript'])}
+    workers = [asyncio.create_task(get_comment(name)) for name in agent_names]
+    remaining = len(workers)
+    while remaining:
+        agent_name, item = await queue.get()
+        if item is done_sentinel:
+            remaining -= 1
+        else:
+            yield {"type": "final_comment_chunk", "agent_name": agent_name, "chunk": item}
 
-上記の議論を踏まえ、暫定的なまとめを作成し、参加者に最終確認を求めてください。
-""")
-    ])
-    
-    chain = prompt | llm
+    state["final_comments"] = list(await asyncio.gather(*workers))
+
+
+async def _stream_text(stream):
+    """Yield just the text deltas of a chain's astream output."""
+    async for chunk in stream:
+        chunk_text = _extract_chunk_text(chunk.content)
+        if chunk_text:
+            yield chunk_text
+
+async def pre_conclusion_node_streaming(state):
+    """Streaming version of pre_conclusion_node."""
     full_response = ""
-    
-    async for chunk in chain.astream({"topic": state["topic"]}):
-        if hasattr(chunk, 'content'):
-            content = chunk.content
-            if isinstance(content, list):
-                chunk_text = ""
-                for item in content:
-                    if isinstance(item, dict) and 'text' in item:
-                        chunk_text += item['text']
-                    # Skip dict items that only contain metadata like {'index': 0}
-                    elif isinstance(item, dict) and len(item) == 1 and 'index' in item:
-                        continue
-                full_response += chunk_text
-                if chunk_text:
-                    yield {"type": "pre_conclusion_chunk", "chunk": chunk_text}
-            else:
-                content_str = str(content)
-                # Filter out common OpenAI Responses API artifacts
-                if content_str.strip() in ["{'index': 0}", "{'index':0}", "{\"index\":0}", "{\"index\": 0}"]:
-                    content_str = ""
-                full_response += content_str
-                if content_str:
-                    yield {"type": "pre_conclusion_chunk", "chunk": content_str}
-    
+
+    stream = _PRE_CONCLUSION_CHAIN.astream({
+        "topic": state["topic"],
+        "transcript": _transcript_text(state),
+    })
+    # Coalesce token-rate deltas: one yielded event per small time/size
+    # window instead of one dict alloc and loop wakeup per token.
+    async for batch in _coalesce(_stream_text(stream)):
+        full_response += batch
+        yield {"type": "pre_conclusion_chunk", "chunk": batch}
+
     state["preliminary_conclusion"] = full_response
     yield {"type": "pre_conclusion_complete", "content": full_response}
 
 async def conclusion_node_streaming(state):
     """Streaming version of conclusion_node."""
-    from .graph import llm
-    from langchain_core.prompts import ChatPromptTemplate
-    from langchain_core.messages import SystemMessage, HumanMessage
-    
     if state["preliminary_conclusion"] and state["final_comments"]:
-        prompt = ChatPromptTemplate.from_messages([
-            SystemMessage(content=f"""あなたは議論の結論をまとめる専門家です。以下の情報を統合して、最終的な結論を作成してください。
-
-**重要な指示:**
-1. 暫定的な結論案を基礎として使用してください
-2. 参加者の最終意見を十分に考慮して、必要な修正や補足を行ってください
-3. 最終的な結論は包括的で、全ての重要な論点を含むようにしてください
-4. 意見が分かれた場合は、それも明確に記述してください
-
-議論のテーマ: {state["topic"]}"""),
-            HumanMessage(content=f"""
-**暫定的な結論案:**
-{state['preliminary_conclusion']}
+        stream = _CONCLUSION_CHAIN.astream({
+            "topic": state["topic"],
+            "preliminary_conclusion": state["preliminary_conclusion"],
+            "final_comments": "\n".join(state["final_comments"]),
+            "transcript": _transcript_text(state),
+        })
+    else:
+        stream = _SIMPLE_CONCLUSION_CHAIN.astream({
+            "topic": state["topic"],
+            "transcript": _transcript_text(state),
+        })
 
-**参加者の最終意見:**
-{chr(10).join(state['final_comments'])}
+    full_conclusion = ""
 
-**完全な議論記録:**
-{chr(10).join(state['full_transcript'])}
+    async for batch in _coalesce(_stream_text(stream)):
+        full_conclusion += batch
+        yield {"type": "conclusion_chunk", "chunk": batch}
 
-上記の情報を統合して、最終的な結論を作成してください。
-""")
-        ])
-    else:
-        prompt = ChatPromptTemplate.from_messages([
-            SystemMessage(content="あなたは議論の結論をまとめる専門家です。以下の議論の完全な記録を読み、最終的な結論を客観的に要約してください。意見が分かれた場合は、それも明確に記述してください。議論のテーマ:" + state["topic"]),
-            HumanMessage(content="\n".join(state["full_transcript"])) 
-        ])
-    
-    chain = prompt | llm
-    full_conclusion = ""
-    
-    async for chunk in chain.astream({}):
-        if hasattr(chunk, 'content'):
-            content = chunk.content
-            if isinstance(content, list):
-                chunk_text = ""
-                for item in content:
-                    if isinstance(item, dict) and 'text' in item:
-                        chunk_text += item['text']
-                    # Skip dict items that only contain metadata like {'index': 0}
-                    elif isinstance(item, dict) and len(item) == 1 and 'index' in item:
-                        continue
-                full_conclusion += chunk_text
-                if chunk_text:
-                    yield {"type": "conclusion_chunk", "chunk": chunk_text}
-            else:
-                content_str = str(content)
-                # Filter out common OpenAI Responses API artifacts
-                if content_str.strip() in ["{'index': 0}", "{'index':0}", "{\"index\":0}", "{\"index\": 0}"]:
-                    content_str = ""
-                full_conclusion += content_str
-                if content_str:
-                    yield {"type": "conclusion_chunk", "chunk": content_str}
-    
     state["conclusion"] = full_conclusion
     yield {"type": "conclusion_complete", "conclusion": full_conclusion}
@@ -2,38 +2,49 @@
 New State Management for Conversational Agents
 """
 import logging
+from io import StringIO
 from typing import TypedDict, List, Dict, Optional
-from langchain_core.messages import BaseMessage
 
 class AgentState(TypedDict):
     """State for a single agent."""
     name: str
     persona: str
     subjective_view: str # New field for subjective perspective
-    chat_history: List[BaseMessage]
+    global_history: object  # Shared bounded deque of {"speaker", "text"} entries (one copy per debate)
+    history_summary: str  # Rolling summary of turns older than the prompt window
 
 class ConversationState(TypedDict):
     """Global state for the conversation."""
     topic: str
     agent_states: Dict[str, AgentState]
+    global_history: object  # Same shared deque the agents hold; appended once per turn
     next_speaker: str
+    last_speaker: str  # Who spoke last; saves re-parsing the transcript in the round-robin fallback
     current_turn: int
     max_turns: int
     conclusion: Optional[str]
     full_transcript: List[str]
+    transcript_buffer: StringIO  # Incrementally written copy of the transcript for O(1) prompt assembly
     logger: logging.Logger
     # --- New monitoring fields ---
     convergence_score: float  # Similarity score between recent statements
-    ready_flags: List[bool]   # List of ready_to_conclude flags from agents
-    statement_embeddings: List[List[float]]  # Store embeddings for convergence calculation
+    ready_flags: object       # Preallocated np.uint8 buffer of ready_to_conclude flags
+    ready_count: int          # Running count of set ready_flags (avoids re-summing)
+    ready_total: int          # Number of filled ready_flags slots
+    statement_embeddings: Optional[object]  # Preallocated (max_turns+1, dim) float32 matrix of L2-normalized rows; lazily sized on first embedding
+    n_embeddings: int  # Number of filled rows in statement_embeddings
+    pending_embedding_task: Optional[object]  # In-flight batched embedding task, awaited next metrics pass
+    unembedded_statements: List[str]  # Statements awaiting the next batched embedding call
+    last_tokens: set  # Token set of the previous statement, for the Jaccard prefilter
+    recent_turns_text: str  # Last three transcript lines, rendered once per metrics pass
     # --- Facilitator fields ---
     facilitator_check_interval: int  # Check every N turns
     facilitator_action: Optional[str]  # "continue", "propose_conclusion", "call_vote"
+    pending_facilitator_task: Optional[object]  # Speculative facilitator evaluation overlapping the current turn
     facilitator_message: Optional[str]  # Message from facilitator when taking action
     # --- Phased termination fields ---
     preliminary_conclusion: Optional[str]  # Draft conclusion from pre_conclusion_node
     final_comments: List[str]  # Final comments from agents before conclusion
     # --- Discussion quality metrics ---
-    topic_diversity: float  # Diversity of topics discussed
     discussion_depth: float  # How deeply issues have been explored
-    pending_questions: List[str]  # Questions that need responses
+    pending_questions: Dict[str, str]  # Question text -> asking agent; insertion-ordered, O(1) dedup/removal
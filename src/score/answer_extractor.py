@@ -2,11 +2,22 @@
 議論結論からの回答抽出モジュール
 """
 
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Optional, Tuple, Dict
 from dataclasses import dataclass
 from abc import ABC, abstractmethod
 
+try:
+    import ahocorasick
+except ImportError:  # オプション依存（pip install .[fast-matching]）
+    ahocorasick = None
+
+# 選択肢記号。有効範囲の判定は_LETTERS[:len(options)]への部分文字列
+# 検査で行い、呼び出しごとのリスト生成とchr/ord計算を避ける。
+_LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
 
 @dataclass
 class AnswerExtraction:
@@ -51,18 +62,45 @@ class PatternMatchingStrategy(ExtractionStrategy):
             r'最終的.*選択肢.*「([A-Z])\)',
             r'は「([A-Z])\).*」です',
         ]
-    
+        # 全パターンを1本の選択肢付き正規表現に融合してコンパイルしておく。
+        # 以前はextract呼び出しごとに各パターンをre.findallしており、
+        # 結論文字列をパターン数ぶん走査していた。
+        self._fused = re.compile(
+            "|".join(f"(?:{p})" for p in self.answer_patterns), re.IGNORECASE
+        )
+        # 各パターンが必ず含む固定リテラル語。Aho-Corasickで1回走査して
+        # どれも現れない結論では正規表現を走らせない（手掛かり語が無い
+        # 結論が多数派なので、その場合の抽出はDFA1回のO(n)で済む）。
+        self._automaton = None
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for keyword in ("答えは", "正解は", "選択肢", "が正しい", "だと思う",
+                            "です", ":", "番", "を選", "結論", "「"):
+                automaton.add_word(keyword, keyword)
+            automaton.make_automaton()
+            self._automaton = automaton
+
     def extract(self, conclusion: str, options: List[str]) -> AnswerExtraction:
+        # リテラル前置フィルタ: 手掛かり語が1つも無ければマッチし得ない
+        if self._automaton is not None and next(self._automaton.iter(conclusion), None) is None:
+            return AnswerExtraction(
+                extracted_answer=None,
+                confidence_score=0.0,
+                extraction_method="pattern_matching",
+                alternative_candidates=[],
+                reasoning="パターンマッチングで回答を抽出できませんでした"
+            )
+
         candidates = {}
-        
-        # 各パターンでマッチング
-        for pattern in self.answer_patterns:
-            matches = re.findall(pattern, conclusion, re.IGNORECASE)
-            for match in matches:
-                letter = match.upper()
-                # 有効な選択肢の範囲内かチェック
-                if letter in [chr(ord('A') + i) for i in range(len(options))]:
-                    candidates[letter] = candidates.get(letter, 0) + 1
+        valid_letters = _LETTERS[:len(options)]
+
+        # 融合した正規表現で1回走査（各分岐はキャプチャ1個なので
+        # lastindexがマッチした分岐のグループを指す）
+        for match in self._fused.finditer(conclusion):
+            letter = match.group(match.lastindex).upper()
+            # 有効な選択肢の範囲内かチェック
+            if letter in valid_letters:
+                candidates[letter] = candidates.get(letter, 0) + 1
         
         if not candidates:
             return AnswerExtraction(
@@ -94,25 +132,38 @@ class PatternMatchingStrategy(ExtractionStrategy):
 
 class SemanticSimilarityStrategy(ExtractionStrategy):
     """選択肢テキストとの意味的類似度による抽出"""
-    
+
+    def __init__(self):
+        # 選択肢は問題ごとに固定なので、トークン集合を選択肢タプルを
+        # キーにメモ化し、extract呼び出しごとの再分割を避ける
+        self._option_sets_cache: Dict[tuple, List[frozenset]] = {}
+
+    def _option_sets(self, options: List[str]) -> List[frozenset]:
+        key = tuple(options)
+        sets = self._option_sets_cache.get(key)
+        if sets is None:
+            if len(self._option_sets_cache) > 256:
+                self._option_sets_cache.clear()
+            sets = [frozenset(option.lower().split()) for option in options]
+            self._option_sets_cache[key] = sets
+        return sets
+
     def extract(self, conclusion: str, options: List[str]) -> AnswerExtraction:
-        # 簡単な単語ベースの類似度計算
+        # 簡単な単語ベースの類似度計算。結論側のトークン集合は1回だけ
+        # 構築し、選択肢側はメモ化済みの集合を使う。
+        conclusion_words = frozenset(conclusion.lower().split())
         similarities = []
-        
-        for i, option in enumerate(options):
-            # 選択肢の重要な単語を抽出
-            option_words = set(option.lower().split())
-            conclusion_words = set(conclusion.lower().split())
-            
+
+        for i, option_words in enumerate(self._option_sets(options)):
             # Jaccard類似度を計算
             intersection = len(option_words & conclusion_words)
             union = len(option_words | conclusion_words)
-            
+
             if union > 0:
                 similarity = intersection / union
             else:
                 similarity = 0.0
-            
+
             similarities.append((chr(ord('A') + i), similarity))
         
         # 最も類似度の高い選択肢を選択
@@ -148,7 +199,7 @@ class LastResortStrategy(ExtractionStrategy):
         last_chars = conclusion[-50:] if len(conclusion) > 50 else conclusion
         
         # 有効な選択肢文字を検索
-        valid_letters = [chr(ord('A') + i) for i in range(len(options))]
+        valid_letters = _LETTERS[:len(options)]
         found_letters = []
         
         for char in reversed(last_chars):
@@ -241,18 +292,39 @@ class AnswerExtractor:
             )
     
     def batch_extract(
-        self, 
-        conclusions: List[str], 
-        options_list: List[List[str]]
+        self,
+        conclusions: List[str],
+        options_list: List[List[str]],
+        n_workers: Optional[int] = None
     ) -> List[AnswerExtraction]:
-        """複数の結論をバッチ処理で抽出"""
-        results = []
-        
-        for conclusion, options in zip(conclusions, options_list):
-            extraction = self.extract_with_confidence(conclusion, options)
-            results.append(extraction)
-        
-        return results
+        """複数の結論をバッチ処理で抽出
+
+        正規表現と集合演算が主体のCPUバウンド処理で各ペアは独立なので、
+        大きなバッチはプロセスプールでGILの外に出す。小さなバッチは
+        ワーカー起動コストの方が高いため逐次処理のまま。
+        """
+        pairs = list(zip(conclusions, options_list))
+
+        if len(pairs) < 32:
+            return [self.extract_with_confidence(c, o) for c, o in pairs]
+
+        if n_workers is None:
+            n_workers = os.cpu_count()
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            return list(executor.map(_extract_one, pairs, chunksize=32))
+
+
+# ProcessPoolExecutor用はモジュールスコープ関数である必要がある。
+# 抽出器はワーカープロセスごとに1回だけ構築して使い回す。
+_WORKER_EXTRACTOR: Optional[AnswerExtractor] = None
+
+
+def _extract_one(pair: Tuple[str, List[str]]) -> AnswerExtraction:
+    global _WORKER_EXTRACTOR
+    if _WORKER_EXTRACTOR is None:
+        _WORKER_EXTRACTOR = AnswerExtractor()
+    conclusion, options = pair
+    return _WORKER_EXTRACTOR.extract_with_confidence(conclusion, options)
 
 
 if __name__ == "__main__":
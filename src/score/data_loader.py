@@ -4,10 +4,16 @@ MMLU PROデータ読み込みモジュール
 
 import pandas as pd
 import ast
+import json
 import re
 from typing import List, Dict, Any, Optional
 from dataclasses import dataclass
 
+# フォールバック用の正規表現はモジュール読み込み時に1回だけコンパイルする
+_WS_RE = re.compile(r'\s+')
+_DQ_RE = re.compile(r'\"([^\"]*?)\"', re.DOTALL)
+_SQ_RE = re.compile(r"'([^']*?)'", re.DOTALL)
+
 
 @dataclass
 class MMLUProblem:
@@ -28,15 +34,52 @@ class MMLUDataLoader:
     
     def __init__(self, csv_path: str):
         self.csv_path = csv_path
-        
+        # パース済み問題のキャッシュ。stratified_sampleとget_category_stats
+        # の両方を使うとCSVの読み込み・パースが二重に走っていた。
+        self._problems: Optional[List[MMLUProblem]] = None
+        # 直近で成功した選択肢パーサ（フォーマットのスニッフ結果）
+        self._opt_parser = None
+
+    def invalidate(self) -> None:
+        """キャッシュを破棄し、次回load_and_validateでCSVを再読込する"""
+        self._problems = None
+
     def load_and_validate(self) -> List[MMLUProblem]:
-        """CSVを読み込み、データを検証して返す"""
+        """CSVを読み込み、データを検証して返す（結果はインスタンスにキャッシュ）"""
+        if self._problems is not None:
+            return self._problems
+
         df = pd.read_csv(self.csv_path)
         problems = []
-        
-        for _, row in df.iterrows():
+
+        # iterrows()は1行ごとにSeriesを生成するため最も遅い反復方法。
+        # 列をまとめて取り出してzipで回すことで、セル単位のboxingを
+        # なくす。cot_contentの欠損はfillnaで列単位に先に処理する。
+        rows = zip(
+            df['question_id'].astype(str),
+            df['question'].astype(str),
+            df['question_ja'].astype(str),
+            df['options'],
+            df['answer'].astype(str),
+            df['answer_index'],
+            df['category'].astype(str),
+            df['src'].astype(str),
+            df['cot_content'].fillna("").astype(str),
+        )
+        for (question_id, question, question_ja, options_str, answer,
+             answer_index, category, source, cot_content) in rows:
             try:
-                problem = self._row_to_problem(row)
+                problem = MMLUProblem(
+                    question_id=question_id,
+                    question=question,
+                    question_ja=question_ja,
+                    options=self.preprocess_options(options_str),
+                    correct_answer=answer,
+                    correct_index=int(answer_index),
+                    category=category,
+                    source=source,
+                    cot_content=cot_content,
+                )
                 if self.validate_problem(problem):
                     problems.append(problem)
                 else:
@@ -44,86 +87,69 @@ class MMLUDataLoader:
             except Exception as e:
                 print(f"問題データの読み込みエラー: {e}")
                 continue
-                
+
         print(f"有効な問題を{len(problems)}件読み込みました")
+        self._problems = problems
         return problems
     
-    def _row_to_problem(self, row) -> MMLUProblem:
-        """DataFrameの行をMMLUProblemに変換"""
-        # 選択肢の解析
-        options = self.preprocess_options(row['options'])
-        
-        return MMLUProblem(
-            question_id=str(row['question_id']),
-            question=str(row['question']),
-            question_ja=str(row['question_ja']),
-            options=options,
-            correct_answer=str(row['answer']),
-            correct_index=int(row['answer_index']),
-            category=str(row['category']),
-            source=str(row['src']),
-            cot_content=str(row['cot_content']) if pd.notna(row['cot_content']) else ""
-        )
-    
+    @staticmethod
+    def _clean_items(items) -> List[str]:
+        """パース結果の各要素を正規化（連続空白を単一空白に）"""
+        clean_options = []
+        for option in items:
+            clean_option = _WS_RE.sub(' ', str(option).strip())
+            if clean_option:
+                clean_options.append(clean_option)
+        return clean_options
+
+    def _parse_json(self, options_str: str) -> Optional[List[str]]:
+        # JSON形式での解析（最も確実）
+        try:
+            return self._clean_items(json.loads(options_str)) or None
+        except (json.JSONDecodeError, ValueError):
+            return None
+
+    def _parse_double_quoted(self, options_str: str) -> Optional[List[str]]:
+        # ダブルクォート用正規表現
+        return self._clean_items(_DQ_RE.findall(options_str)) or None
+
+    def _parse_single_quoted(self, options_str: str) -> Optional[List[str]]:
+        # シングルクォート用正規表現
+        return self._clean_items(_SQ_RE.findall(options_str)) or None
+
+    def _parse_literal(self, options_str: str) -> Optional[List[str]]:
+        # 従来のast.literal_eval
+        try:
+            return self._clean_items(ast.literal_eval(options_str)) or None
+        except (ValueError, SyntaxError):
+            return None
+
+    _OPTION_PARSERS = (_parse_json, _parse_double_quoted,
+                       _parse_single_quoted, _parse_literal)
+
     def preprocess_options(self, options_str: str) -> List[str]:
         """選択肢文字列を配列に変換"""
         try:
-            # 標準的なリスト形式に変換を試行
-            if options_str.startswith('[') and options_str.endswith(']'):
-                # まずJSON形式での解析を試行（最も確実）
-                import json
-                try:
-                    options = json.loads(options_str)
-                    clean_options = []
-                    for option in options:
-                        clean_option = re.sub(r'\s+', ' ', str(option).strip())
-                        if clean_option:
-                            clean_options.append(clean_option)
-                    return clean_options
-                except (json.JSONDecodeError, ValueError):
-                    pass
-                
-                # JSON解析に失敗した場合、ダブルクォート用正規表現を試行
-                pattern = r'\"([^\"]*?)\"'
-                matches = re.findall(pattern, options_str, re.DOTALL)
-                
-                if matches:
-                    # 改行文字や余分な空白を処理
-                    clean_options = []
-                    for match in matches:
-                        # 改行文字を空白に置換し、連続する空白を単一に
-                        clean_option = re.sub(r'\s+', ' ', match.strip())
-                        if clean_option:  # 空文字列でない場合のみ追加
-                            clean_options.append(clean_option)
-                    return clean_options
-                
-                # シングルクォート用正規表現を試行
-                pattern = r"'([^']*?)'"
-                matches = re.findall(pattern, options_str, re.DOTALL)
-                
-                if matches:
-                    clean_options = []
-                    for match in matches:
-                        clean_option = re.sub(r'\s+', ' ', match.strip())
-                        if clean_option:
-                            clean_options.append(clean_option)
-                    return clean_options
-                
-                # 正規表現で失敗した場合、従来のast.literal_evalを試行
-                try:
-                    options = ast.literal_eval(options_str)
-                    clean_options = []
-                    for option in options:
-                        clean_option = re.sub(r'\s+', ' ', str(option).strip())
-                        if clean_option:
-                            clean_options.append(clean_option)
-                    return clean_options
-                except (ValueError, SyntaxError):
-                    pass
-            
-            # その他の形式への対応
+            # 標準的なリスト形式のみ対応
+            if not (options_str.startswith('[') and options_str.endswith(']')):
+                return []
+
+            # options列のフォーマットはファイル内で揃っているため、
+            # 前回成功したパーサを最初に試し、フォールバック連鎖は
+            # 初回と形式が変わった行だけが通る。
+            preferred = self._opt_parser
+            if preferred is not None:
+                result = preferred(self, options_str)
+                if result is not None:
+                    return result
+
+            for parser in self._OPTION_PARSERS:
+                result = parser(self, options_str)
+                if result is not None:
+                    self._opt_parser = parser
+                    return result
             return []
-            
+
         except Exception as e:
             print(f"選択肢のパースで予期しないエラー: {options_str[:50]}..., エラー: {e}")
             return []
@@ -174,108 +174,99 @@ async def run_mmlu_graph(topic: str, max_turns: int = 15) -> Dict[str, Any]:
     """MMLU用の議論グラフを実行"""
     from .orchestrator import run_graph
     from .config import MMLU_AGENTS_CONFIG
+
+    # MMLU専用エージェントはrun_graphの引数として渡す。以前の
+    # config.AGENTS_CONFIG差し替えは、orchestratorがimport時に束縛した
+    # 名前には効かない壊れたmonkeypatchだった。
+    # 議論を実行（結論生成前まで）
+    results = []
+    full_transcript = []
     
-    # 既存のrun_graph関数を使用するが、MMLU専用エージェントを設定
-    original_config = None
-    try:
-        # 一時的にMMLU_AGENTS_CONFIGを使用
-        import src.score.config as config_module
-        original_config = config_module.AGENTS_CONFIG
-        config_module.AGENTS_CONFIG = MMLU_AGENTS_CONFIG
-        
-        # 議論を実行（結論生成前まで）
-        results = []
-        full_transcript = []
-        
-        # エージェント別のメッセージバッファ
-        agent_messages = {}
-        final_comments = []
-        generated_conclusion = None  # conclusion_nodeで生成された結論を格納
-        
-        async for event in run_graph(topic, max_turns):
-            results.append(event)
+    # エージェント別のメッセージバッファ
+    agent_messages = {}
+    final_comments = []
+    generated_conclusion = None  # conclusion_nodeで生成された結論を格納
+    
+    async for event in run_graph(topic, max_turns,
+                                 agents_config=MMLU_AGENTS_CONFIG):
+        results.append(event)
+        
+        # 最終コメント収集
+        if event.get("type") == "final_comments_complete":
+            final_comments = event.get("content", [])
+            print(f"最終コメント収集: {len(final_comments)}件")
+        
+        if event.get("type") == "agent_message_chunk":
+            # ストリーミングメッセージのチャンクを結合
+            agent_name = event.get('agent_name', 'Unknown')
+            chunk = event.get('chunk', '')
             
-            # 最終コメント収集
-            if event.get("type") == "final_comments_complete":
-                final_comments = event.get("content", [])
-                print(f"最終コメント収集: {len(final_comments)}件")
+            if agent_name not in agent_messages:
+                agent_messages[agent_name] = ""
+            agent_messages[agent_name] += chunk
             
-            if event.get("type") == "agent_message_chunk":
-                # ストリーミングメッセージのチャンクを結合
-                agent_name = event.get('agent_name', 'Unknown')
-                chunk = event.get('chunk', '')
+        elif event.get("type") == "agent_message_complete":
+            # エージェントメッセージ完了時に記録
+            agent_name = event.get('agent_name', 'Unknown')
+            if agent_name in agent_messages:
+                complete_message = agent_messages[agent_name].strip()
                 
-                if agent_name not in agent_messages:
-                    agent_messages[agent_name] = ""
-                agent_messages[agent_name] += chunk
+                # JSONの場合はresponseフィールドを抽出
+                extracted_message = complete_message
+                try:
+                    import json
+                    if complete_message.strip().startswith('{') and complete_message.strip().endswith('}'):
+                        parsed = json.loads(complete_message.strip())
+                        if 'response' in parsed:
+                            extracted_message = parsed['response']
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    # JSONでない場合や解析失敗時はそのまま使用
+                    pass
                 
-            elif event.get("type") == "agent_message_complete":
-                # エージェントメッセージ完了時に記録
-                agent_name = event.get('agent_name', 'Unknown')
-                if agent_name in agent_messages:
-                    complete_message = agent_messages[agent_name].strip()
-                    
-                    # JSONの場合はresponseフィールドを抽出
-                    extracted_message = complete_message
-                    try:
-                        import json
-                        if complete_message.strip().startswith('{') and complete_message.strip().endswith('}'):
-                            parsed = json.loads(complete_message.strip())
-                            if 'response' in parsed:
-                                extracted_message = parsed['response']
-                    except (json.JSONDecodeError, KeyError, TypeError):
-                        # JSONでない場合や解析失敗時はそのまま使用
-                        pass
-                    
-                    full_transcript.append(f"{agent_name}: {extracted_message}")
-                    agent_messages[agent_name] = ""  # リセット
-                    
-            elif event.get("type") == "agent_message":
-                # 非ストリーミングメッセージ（フォールバック）
-                agent_name = event.get('agent_name', 'Unknown')
-                message = event.get('message', '')
-                full_transcript.append(f"{agent_name}: {message}")
-                print(f"[Turn {len(full_transcript)}] {agent_name}: {message}")
+                full_transcript.append(f"{agent_name}: {extracted_message}")
+                agent_messages[agent_name] = ""  # リセット
                 
-            elif event.get("type") == "conclusion_complete":
-                # conclusion_nodeで生成された最終結論を取得
-                generated_conclusion = event.get("conclusion", "")
-                print(f"Generated conclusion captured: {len(generated_conclusion)} characters")
-                break
-        
-        # MMLU専用の構造化結論生成
-        # 選択肢を抽出
-        options_match = re.search(r'\*\*選択肢:\*\*\n(.*?)(?=\n\*\*|$)', topic, re.DOTALL)
-        available_choices = []
-        if options_match:
-            options_text = options_match.group(1)
-            # A) B) C) D) 形式の選択肢を抽出
-            option_pattern = r'([A-Z])\)\s*([^\n]+)'
-            found_options = re.findall(option_pattern, options_text)
-            available_choices = [opt[1].strip() for opt in found_options]
-        
-        if not available_choices:
-            available_choices = ["選択肢A", "選択肢B", "選択肢C", "選択肢D"]  # フォールバック
-        
-        mmlu_conclusion = await generate_mmlu_structured_conclusion(
-            full_transcript, 
-            topic, 
-            available_choices, 
-            final_comments, 
-            generated_conclusion  # conclusion_nodeで生成された結論を渡す
-        )
-        
-        return {
-            "conclusion": mmlu_conclusion,
-            "full_transcript": full_transcript,
-            "turn_count": len([e for e in results if e.get("type") == "agent_message"]),
-            "events": results
-        }
-        
-    finally:
-        # 元の設定を復元
-        if original_config is not None:
-            config_module.AGENTS_CONFIG = original_config
+        elif event.get("type") == "agent_message":
+            # 非ストリーミングメッセージ（フォールバック）
+            agent_name = event.get('agent_name', 'Unknown')
+            message = event.get('message', '')
+            full_transcript.append(f"{agent_name}: {message}")
+            print(f"[Turn {len(full_transcript)}] {agent_name}: {message}")
+            
+        elif event.get("type") == "conclusion_complete":
+            # conclusion_nodeで生成された最終結論を取得
+            generated_conclusion = event.get("conclusion", "")
+            print(f"Generated conclusion captured: {len(generated_conclusion)} characters")
+            break
+    
+    # MMLU専用の構造化結論生成
+    # 選択肢を抽出
+    options_match = re.search(r'\*\*選択肢:\*\*\n(.*?)(?=\n\*\*|$)', topic, re.DOTALL)
+    available_choices = []
+    if options_match:
+        options_text = options_match.group(1)
+        # A) B) C) D) 形式の選択肢を抽出
+        option_pattern = r'([A-Z])\)\s*([^\n]+)'
+        found_options = re.findall(option_pattern, options_text)
+        available_choices = [opt[1].strip() for opt in found_options]
+    
+    if not available_choices:
+        available_choices = ["選択肢A", "選択肢B", "選択肢C", "選択肢D"]  # フォールバック
+    
+    mmlu_conclusion = await generate_mmlu_structured_conclusion(
+        full_transcript, 
+        topic, 
+        available_choices, 
+        final_comments, 
+        generated_conclusion  # conclusion_nodeで生成された結論を渡す
+    )
+    
+    return {
+        "conclusion": mmlu_conclusion,
+        "full_transcript": full_transcript,
+        "turn_count": len([e for e in results if e.get("type") == "agent_message"]),
+        "events": results
+    }
 
 
 @dataclass